@@ -0,0 +1,260 @@
+"""Local stand-in for the AliExpress Affiliates API (product.query)
+
+Verifies the HMAC-SHA256 request signature the same way the real API does
+and serves aliexpress_affiliate_product_query_response payloads from a
+generated catalog built on the recorded fixture. Keywords, price bounds,
+page_no and page_size are honored. Latency, error codes, throttling and
+malformed bodies can be injected to measure throughput and resilience:
+
+    export APP_SECRET=standin-secret  # the stand-in and the bot sign with the same secret
+    python bench/aliexpress_standin.py --port 8765 --latency 0.2 --error-rate 0.05
+    ALIEXPRESS_API_URL=http://127.0.0.1:8765/sync python final_bot.py
+
+GET /stats returns the request counters as JSON.
+"""
+import os
+import hmac
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_PATH = os.path.join(BENCH_DIR, 'fixtures', 'product_query_response.json')
+
+# Error codes returned by the real API
+SIGNATURE_ERROR = ('IncompleteSignature', 'The request signature does not conform to platform standards')
+THROTTLE_ERROR = ('ApiCallLimit', 'The request has exceeded the limit.')
+INJECTED_ERRORS = {
+    'ApiCallLimit': 'The request has exceeded the limit.',
+    'isp.service-unavailable': 'The service is temporarily unavailable.',
+    'isp.remote-connection-error': 'Remote connection error.',
+    'InvalidApiPath': 'The specified API path is invalid.',
+}
+
+
+def sign_params(params, app_secret):
+    """Signature of a request: HMAC-SHA256 over the sorted key/value pairs, upper-case hex"""
+    sign_string = ''.join(f'{key}{value}' for key, value in sorted(params.items()))
+    return hmac.new(app_secret.encode('utf-8'), sign_string.encode('utf-8'), hashlib.sha256).hexdigest().upper()
+
+
+def build_catalog(size, seed):
+    """Catalog of `size` products derived from the recorded fixture"""
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    base_products = data['aliexpress_affiliate_product_query_response']['resp_result']['result']['products']['product']
+
+    rnd = random.Random(seed)
+    catalog = []
+    for index in range(size):
+        product = dict(base_products[index % len(base_products)])
+        factor = rnd.uniform(0.5, 2.0)
+        sale = float(product['target_sale_price']) * factor
+        original = float(product['target_original_price']) * factor
+        product_id = 1005007000000000 + index
+        product.update({
+            'product_id': product_id,
+            'target_sale_price': f'{sale:.2f}',
+            'target_original_price': f'{original:.2f}',
+            'sale_price': f'{sale:.2f}',
+            'original_price': f'{original:.2f}',
+            'lastest_volume': rnd.randint(0, 20000),
+            'product_detail_url': f'https://www.aliexpress.com/item/{product_id}.html',
+            'promotion_link': f'https://s.click.aliexpress.com/e/_Dk{product_id:x}',
+        })
+        product['_title'] = product['product_title'].lower()
+        catalog.append(product)
+    # Same default order as sort=LAST_VOLUME_DESC
+    catalog.sort(key=lambda product: product['lastest_volume'], reverse=True)
+    return catalog
+
+
+class StandInState:
+    """Catalog, fault injection settings and counters shared by the request threads"""
+
+    def __init__(self, args):
+        self.args = args
+        self.catalog = build_catalog(args.catalog_size, args.seed)
+        self.rnd = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.tokens = float(args.throttle_rps or 0)
+        self.updated = time.monotonic()
+        self.counters = {'requests': 0, 'ok': 0, 'empty': 0, 'bad_signature': 0, 'throttled': 0,
+                         'injected_errors': 0, 'http_errors': 0, 'malformed': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def chance(self, rate):
+        with self.lock:
+            return rate > 0 and self.rnd.random() < rate
+
+    def throttled(self):
+        """Token bucket of throttle_rps requests per second"""
+        rate = self.args.throttle_rps
+        if not rate:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(rate, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+            return False
+
+    def latency(self):
+        with self.lock:
+            jitter = self.rnd.uniform(-self.args.latency_jitter, self.args.latency_jitter)
+        return max(0.0, self.args.latency + jitter)
+
+    def query(self, params):
+        """product.query result for the request parameters"""
+        keywords = [kw.strip().lower() for kw in params.get('keywords', '').split(',') if kw.strip()]
+        min_price = float(params['min_sale_price']) if params.get('min_sale_price') else None
+        max_price = float(params['max_sale_price']) if params.get('max_sale_price') else None
+        page_no = max(1, int(params.get('page_no', '1')))
+        page_size = min(50, max(1, int(params.get('page_size', '20'))))
+
+        matches = []
+        for product in self.catalog:
+            price = float(product['target_sale_price'])
+            if min_price is not None and price < min_price:
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            if keywords and not any(keyword in product['_title'] for keyword in keywords):
+                continue
+            matches.append(product)
+
+        start = (page_no - 1) * page_size
+        page = [{key: value for key, value in product.items() if key != '_title'}
+                for product in matches[start:start + page_size]]
+        return page_no, len(matches), page
+
+
+def error_body(code, msg):
+    return {'error_response': {'type': 'ISP', 'code': code, 'msg': msg,
+                               'request_id': f'{random.getrandbits(64):016x}'}}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+
+        def log_message(self, format, *args):
+            if state.args.verbose:
+                super().log_message(format, *args)
+
+        def _reply(self, status, body, content_type='application/json;charset=UTF-8'):
+            payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                with state.lock:
+                    self._reply(200, dict(state.counters))
+                return
+            self._handle(dict(parse_qsl(url.query, keep_blank_values=True)))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', '0'))
+            body = self.rfile.read(length).decode('utf-8')
+            params = dict(parse_qsl(urlparse(self.path).query, keep_blank_values=True))
+            params.update(parse_qsl(body, keep_blank_values=True))
+            self._handle(params)
+
+        def _handle(self, params):
+            state.count('requests')
+            time.sleep(state.latency())
+
+            # Signature check - exactly what the real API verifies
+            sign = params.pop('sign', '')
+            if not hmac.compare_digest(sign, sign_params(params, state.args.app_secret)):
+                state.count('bad_signature')
+                self._reply(200, error_body(*SIGNATURE_ERROR))
+                return
+
+            if state.throttled():
+                state.count('throttled')
+                self._reply(200, error_body(*THROTTLE_ERROR))
+                return
+            if state.chance(state.args.http_error_rate):
+                state.count('http_errors')
+                self._reply(502, b'<html><body>502 Bad Gateway</body></html>', 'text/html')
+                return
+            if state.chance(state.args.error_rate):
+                state.count('injected_errors')
+                code = random.choice(state.args.error_codes)
+                self._reply(200, error_body(code, INJECTED_ERRORS.get(code, 'Injected error')))
+                return
+            if state.chance(state.args.malformed_rate):
+                state.count('malformed')
+                self._reply(200, b'{"aliexpress_affiliate_product_query_response": {"resp_result": {"resp_co')
+                return
+
+            page_no, total, products = state.query(params)
+            if not products:
+                state.count('empty')
+                resp_result = {'resp_code': 405, 'resp_msg': 'The result is empty'}
+            else:
+                state.count('ok')
+                resp_result = {'resp_code': 200, 'resp_msg': 'Call succeeds', 'result': {
+                    'current_page_no': page_no,
+                    'current_record_count': len(products),
+                    'total_record_count': total,
+                    'products': {'product': products},
+                }}
+            self._reply(200, {'aliexpress_affiliate_product_query_response': {
+                'resp_result': resp_result,
+                'request_id': f'{random.getrandbits(64):016x}',
+            }})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--app-secret', default=os.getenv('APP_SECRET'),
+                        help='secret used to verify signatures - the one the bot signs with (default: APP_SECRET env)')
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='added response latency (s)')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='+/- random latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction answered with error_response')
+    parser.add_argument('--error-codes', nargs='+', default=['isp.service-unavailable'],
+                        help='codes used for injected errors')
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='fraction answered with HTTP 502')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='fraction answered with a truncated body')
+    parser.add_argument('--throttle-rps', type=float, default=0.0, help='requests/s before ApiCallLimit (0 = off)')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    if not args.app_secret:
+        parser.error('set APP_SECRET (or pass --app-secret) to the secret the bot signs requests with')
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StandInState(args)))
+    server.daemon_threads = True
+    print(f"AliExpress stand-in listening on http://{args.host}:{args.port}/sync ({args.catalog_size} products)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
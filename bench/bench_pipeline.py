@@ -0,0 +1,375 @@
+"""Offline benchmark for the fetch -> filter -> post pipeline
+
+Drives the real bot code against recorded AliExpress responses
+(bench/fixtures) and a fake Telegram bot, so it needs no network access
+and no credentials:
+
+    python bench/bench_pipeline.py
+    python bench/bench_pipeline.py --output results.json --compare old_results.json
+
+With --api-url the fetch stage talks HTTP to a running stand-in server
+(bench/aliexpress_standin.py) instead of the in-process recorded responses.
+
+Reported: filter throughput for pools of 50 to 100k products,
+get_hot_products latency, end-to-end posting cycle latency for all
+channels, peak memory and event-loop blocking time.
+"""
+import os
+import sys
+import zlib
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import shutil
+import atexit
+import statistics
+import tempfile
+import tracemalloc
+
+# Isolated state, no response cache and offline short links - set before importing the bot
+STATE_DIR = tempfile.mkdtemp(prefix='bench_state_')
+atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+os.environ.setdefault('STATE_DB_PATH', os.path.join(STATE_DIR, 'bot_state.db'))
+os.environ.setdefault('API_CACHE_TTL', '0')
+os.environ.setdefault('SHORTENER_BACKEND', 'local')
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import httpx
+import final_bot
+
+FIXTURE_PATH = os.path.join(BENCH_DIR, 'fixtures', 'product_query_response.json')
+POOL_SIZES = [50, 500, 5000, 50000, 100000]
+LAG_SAMPLE_INTERVAL = 0.005  # seconds
+LAG_BLOCK_THRESHOLD = 0.010  # seconds - lag above this counts as blocked time
+
+
+def load_fixture_products():
+    """Products of the recorded product.query response"""
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['aliexpress_affiliate_product_query_response']['resp_result']['result']['products']['product']
+
+
+def make_pool(base_products, size, rnd, id_offset=0):
+    """Pool of `size` products derived from the fixture with unique ids and jittered prices"""
+    pool = []
+    for index in range(size):
+        product = dict(base_products[index % len(base_products)])
+        factor = rnd.uniform(0.6, 1.6)
+        product['product_id'] = 9000000000000 + id_offset + index
+        product['target_sale_price'] = f"{float(product['target_sale_price']) * factor:.2f}"
+        product['target_original_price'] = f"{float(product['target_original_price']) * factor:.2f}"
+        pool.append(product)
+    return pool
+
+
+def fixture_transport(base_products, latency):
+    """httpx transport answering product queries from the fixture after `latency` seconds"""
+    rnd = random.Random(7)
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        params = request.url.params
+        page_no = int(params.get('page_no', '1'))
+        page_size = int(params.get('page_size', '50'))
+        # Different pages and keyword sets return different product ids (crc32 - stable across runs, unlike hash())
+        offset = page_no * 1000000 + zlib.crc32(params.get('keywords', '').encode()) % 1000 * 1000
+        products = make_pool(base_products, page_size, rnd, offset)
+        body = {'aliexpress_affiliate_product_query_response': {'resp_result': {
+            'resp_code': 200, 'resp_msg': 'Call succeeds',
+            'result': {'current_page_no': page_no, 'current_record_count': len(products),
+                       'products': {'product': products}}
+        }}}
+        return httpx.Response(200, json=body)
+
+    return httpx.MockTransport(handler)
+
+
+def image_transport(latency):
+    """httpx transport answering image checks with a small JPEG after `latency` seconds"""
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, headers={'Content-Type': 'image/jpeg', 'Content-Length': '48213'})
+
+    return httpx.MockTransport(handler)
+
+
+class FakePhotoSize:
+    """Minimal stand-in for telegram.PhotoSize"""
+
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class FakeMessage:
+    """Minimal stand-in for telegram.Message"""
+
+    def __init__(self, message_id, photo=None):
+        self.message_id = message_id
+        self.photo = [FakePhotoSize(f'{photo}-small'), FakePhotoSize(f'{photo}-large')] if photo else []
+
+
+class FakeBot:
+    """Fake Telegram Bot - records sends and answers after a fixed latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def _send(self, photo=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        file_id = None
+        if photo:
+            # Known file_ids come back unchanged, URLs get a new one
+            file_id = photo.rsplit('-', 1)[0] if photo.startswith('file-') else f'file-{self.sent}'
+        return FakeMessage(self.sent, file_id)
+
+    async def send_photo(self, **kwargs):
+        return await self._send(**kwargs)
+
+    async def send_message(self, **kwargs):
+        return await self._send(**kwargs)
+
+    async def edit_message_text(self, **kwargs):
+        return await self._send(**kwargs)
+
+    async def shutdown(self):
+        pass
+
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked by sampling sleep overshoot"""
+
+    def __init__(self):
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            self.lags.append(max(0.0, loop.time() - start - LAG_SAMPLE_INTERVAL))
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def summary(self):
+        blocked = [lag for lag in self.lags if lag > LAG_BLOCK_THRESHOLD]
+        return {
+            'max_lag_ms': round(max(self.lags, default=0.0) * 1000, 3),
+            'blocked_ms': round(sum(blocked) * 1000, 3),
+            'blocked_samples': len(blocked),
+        }
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def reset_state():
+    """Forget everything a previous run left behind"""
+    final_bot.POSTED_PRODUCTS.clear()
+    final_bot.API_RESPONSE_CACHE.clear()
+    final_bot.FILTER_STATS.clear()
+    for buffer in final_bot.PREFETCHER.buffers.values():
+        buffer.clear()
+
+
+def bench_filter(base_products, sizes):
+    """Filter throughput of every channel pipeline over growing pools"""
+    api = final_bot.aliexpress_api
+    results = {}
+    for size in sizes:
+        pool = make_pool(base_products, size, random.Random(size))
+        per_channel = {}
+        total_time = 0.0
+        for channel_key, channel_config in final_bot.CHANNELS_CONFIG.items():
+            api._filter_products(pool[:50], channel_config, channel_key)  # compile outside the timing
+            start = time.perf_counter()
+            accepted = api._filter_products(pool, channel_config, channel_key)
+            elapsed = time.perf_counter() - start
+            total_time += elapsed
+            per_channel[channel_key] = {
+                'seconds': round(elapsed, 6),
+                'accepted': len(accepted),
+                'products_per_sec': round(size / elapsed) if elapsed else None,
+            }
+
+        tracemalloc.start()
+        for channel_key, channel_config in final_bot.CHANNELS_CONFIG.items():
+            api._filter_products(pool, channel_config, channel_key)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[str(size)] = {
+            'products_per_sec': round(size * len(final_bot.CHANNELS_CONFIG) / total_time) if total_time else None,
+            'peak_memory_mb': round(peak / 1024 / 1024, 3),
+            'channels': per_channel,
+        }
+        print(f"filter  {size:>7} products: {results[str(size)]['products_per_sec']:>10} products/s "
+              f"(peak {results[str(size)]['peak_memory_mb']} MB)")
+    return results
+
+
+async def bench_get_hot_products(repeats):
+    """get_hot_products latency per channel against the recorded responses"""
+    samples = []
+    with LoopLagMonitor() as monitor:
+        for _ in range(repeats):
+            for channel_config in final_bot.CHANNELS_CONFIG.values():
+                reset_state()
+                start = time.perf_counter()
+                await final_bot.aliexpress_api.get_hot_products(page_size=50, channel_config=channel_config)
+                samples.append(time.perf_counter() - start)
+    result = {**percentiles(samples), 'calls': len(samples), 'event_loop': monitor.summary()}
+    print(f"fetch   get_hot_products: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms")
+    return result
+
+
+async def bench_cycle(repeats, fake_bot):
+    """End-to-end post_products_job over every channel"""
+    snapshot = final_bot.CHANNEL_STORE.snapshot
+    for channel_key in snapshot.channels:
+        snapshot = snapshot.replace(channel_key, active=True)
+    final_bot.CHANNEL_STORE.install(snapshot)  # in memory only - the channels file is left alone
+    samples = []
+    posts = []
+    with LoopLagMonitor() as monitor:
+        for _ in range(repeats):
+            reset_state()
+            sent_before = fake_bot.sent
+            start = time.perf_counter()
+            await final_bot.post_products_job()
+            samples.append(time.perf_counter() - start)
+            posts.append(fake_bot.sent - sent_before)
+
+    reset_state()
+    tracemalloc.start()
+    await final_bot.post_products_job()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        **percentiles(samples),
+        'cycles': repeats,
+        'channels': len(final_bot.CHANNELS_CONFIG),
+        'posts_per_cycle': statistics.mean(posts),
+        'peak_memory_mb': round(peak / 1024 / 1024, 3),
+        'event_loop': monitor.summary(),
+    }
+    print(f"cycle   {len(final_bot.CHANNELS_CONFIG)} channels: p50 {result['p50_ms']} ms, "
+          f"{result['posts_per_cycle']} posts, max loop lag {result['event_loop']['max_lag_ms']} ms")
+    return result
+
+
+def compare(current, previous_path):
+    """Print the main metrics next to a previous result file"""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+
+    metrics = [('cycle p50 ms', ('cycle', 'p50_ms')),
+               ('cycle peak MB', ('cycle', 'peak_memory_mb')),
+               ('cycle max loop lag ms', ('cycle', 'event_loop', 'max_lag_ms')),
+               ('fetch p50 ms', ('get_hot_products', 'p50_ms'))]
+    metrics += [(f'filter {size} products/s', ('filter_throughput', str(size), 'products_per_sec'))
+                for size in POOL_SIZES]
+
+    def lookup(data, path):
+        for key in path:
+            if not isinstance(data, dict) or key not in data:
+                return None
+            data = data[key]
+        return data
+
+    print(f"\n{'metric':<30}{'previous':>14}{'current':>14}{'change':>10}")
+    for label, path in metrics:
+        old, new = lookup(previous, path), lookup(current, path)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else '-'
+        print(f"{label:<30}{str(old):>14}{str(new):>14}{change:>10}")
+
+
+async def run(args):
+    base_products = load_fixture_products()
+    random.seed(args.seed)
+
+    # Recorded AliExpress responses (or a stand-in server) and a fake Telegram bot
+    if args.api_url:
+        api = final_bot.AliExpressAPI(final_bot.APP_KEY, final_bot.APP_SECRET)
+        api.api_url = args.api_url
+    else:
+        api = final_bot.AliExpressAPI(final_bot.APP_KEY, final_bot.APP_SECRET,
+                                      transport=fixture_transport(base_products, args.api_latency))
+    final_bot.aliexpress_api = api
+    final_bot.PREFETCHER.api = api
+    final_bot.IMAGE_VALIDATOR = final_bot.ImageValidator(transport=image_transport(args.api_latency))
+    if not args.real_rate_limits:
+        # Measure the pipeline, not Telegram's flood limits
+        final_bot.TELEGRAM_CHANNEL_RATE = 1000
+        final_bot.TELEGRAM_GLOBAL_RATE = 1000
+    fake_bot = FakeBot(args.telegram_latency)
+    final_bot.TELEGRAM_SENDER = final_bot.TelegramSendQueue(fake_bot)
+
+    sizes = [size for size in POOL_SIZES if size <= args.max_pool]
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'api_url': args.api_url,
+            'api_latency_s': None if args.api_url else args.api_latency,
+            'telegram_latency_s': args.telegram_latency,
+            'real_rate_limits': args.real_rate_limits,
+            'seed': args.seed,
+        },
+        'filter_throughput': bench_filter(base_products, sizes),
+        'get_hot_products': await bench_get_hot_products(args.repeats),
+        'cycle': await bench_cycle(args.repeats, fake_bot),
+    }
+    await api.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='bench_results.json', help='machine-readable result file')
+    parser.add_argument('--compare', help='previous result file to compare against')
+    parser.add_argument('--repeats', type=int, default=5, help='cycles / fetch rounds to time')
+    parser.add_argument('--api-url', help='AliExpress stand-in server URL, e.g. http://127.0.0.1:8765/sync')
+    parser.add_argument('--api-latency', type=float, default=0.15, help='simulated AliExpress latency (s)')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='simulated Telegram latency (s)')
+    parser.add_argument('--max-pool', type=int, default=max(POOL_SIZES), help='largest filter pool')
+    parser.add_argument('--real-rate-limits', action='store_true', help='keep Telegram flood limits')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Keep the bot's per-request INFO logging out of the measurements
+    final_bot.logging.getLogger().setLevel(final_bot.logging.WARNING)
+
+    results = asyncio.run(run(args))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
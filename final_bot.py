@@ -5,27 +5,86 @@ import logging
 import time
 import hmac
 import hashlib
-import urllib.parse
-import requests
+import httpx
 import random
-from datetime import datetime
-from typing import Dict, Optional, List
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import TelegramError
+import re
+import heapq
+import math
+import bisect
+import itertools
+import contextlib
+import sqlite3
+import secrets
+from collections import OrderedDict, Counter, defaultdict
+from functools import lru_cache
+from types import MappingProxyType
+from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Callable, Awaitable
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError, RetryAfter, BadRequest, NetworkError, Conflict
+from telegram.request import HTTPXRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+try:
+    import fcntl  # leader election between worker processes (POSIX only)
+except ImportError:
+    fcntl = None
+
+# Logging settings - LOG_FORMAT=json writes one JSON object per line for log shippers
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text or json
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record - fields passed with extra= become keys of their own"""
+    
+    reserved = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, pytz.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in self.reserved)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# Configure logging - messages use %-style arguments so skipped records are never formatted
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(JsonLogFormatter() if LOG_FORMAT == 'json' else
+                         logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+logging.basicConfig(handlers=[log_handler], level=LOG_LEVEL)
+logging.getLogger('httpx').setLevel(logging.WARNING)  # one line per HTTP request otherwise (every poll)
 logger = logging.getLogger(__name__)
 
 # AliExpress API Configuration
-ALIEXPRESS_API_URL = "https://api-sg.aliexpress.com/sync"
-APP_KEY = "511896"
-APP_SECRET = "xe8oIZLMqCoPT4vCNMxiLcU78F7njsCl"
+# ALIEXPRESS_API_URL can point at a local stand-in server (bench/aliexpress_standin.py)
+ALIEXPRESS_API_URL = os.getenv('ALIEXPRESS_API_URL', "https://api-sg.aliexpress.com/sync")
+APP_KEY = os.getenv('APP_KEY', "511896")
+APP_SECRET = os.getenv('APP_SECRET', "xe8oIZLMqCoPT4vCNMxiLcU78F7njsCl")
+
+# AliExpress HTTP client settings (one pooled keep-alive client for the whole bot)
+ALIEXPRESS_CONNECT_TIMEOUT = 5  # seconds
+ALIEXPRESS_READ_TIMEOUT = 15  # seconds - a hanging endpoint is retried instead of waited on
+ALIEXPRESS_MAX_CONNECTIONS = 10
+ALIEXPRESS_KEEPALIVE_CONNECTIONS = 6
+ALIEXPRESS_KEEPALIVE_EXPIRY = 300  # seconds - keep TLS sessions warm between cycles
+
+# AliExpress resilience - retries with jittered exponential backoff, hedged requests, circuit breaker
+ALIEXPRESS_RETRIES = 3  # extra attempts after a transient failure
+ALIEXPRESS_RETRY_BASE = 0.5  # seconds - backoff cap of the first retry, doubled for every further one
+ALIEXPRESS_RETRY_MAX = 8  # seconds - largest backoff
+ALIEXPRESS_HEDGE_DELAY = float(os.getenv('ALIEXPRESS_HEDGE_DELAY', '3'))  # seconds before a slow query is raced by a copy (0 = off)
+ALIEXPRESS_TRANSIENT_CODES = frozenset({
+    'ApiCallLimit', 'isp.service-unavailable', 'isp.remote-connection-error', 'isp.remote-service-timeout',
+    'isp.unknown-error', 'isv.unknown-error',
+})
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive transient failures that open the circuit
+BREAKER_RESET_TIMEOUT = 60  # seconds the circuit stays open before one probe request is let through
 
 # Telegram Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8353510100:AAHPLe2dqKEdD0CAHROJiho1nrQWwj5ItgU')
@@ -33,474 +92,1321 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8353510100:AAHPLe2dqKEdD0C
 # Multiple Admin User IDs - only these users can control the bot
 ADMIN_USER_IDS = [5255786759, 5232979183, 990541]
 
-# Multi-Channel Configuration with specific filters
-CHANNELS_CONFIG = {
-    'hot_deals': {
-        'channel_id': '@HotFindsExpress',
-        'name': 'Hot Finds & Deals',
-        'active': True,
-        'posting_interval': 105,  # minutes (~1h 45m) - Fast channel
-        'min_price': 0,  # No minimum price filter
-        'max_price': 1000,  # High max for variety
-        'min_commission': 0,  # No commission filter - get everything!
-        'keywords': [],  # No keywords - get all trending products!
-        'exclude_keywords': ['fake', 'replica', 'used', 'broken']
-    },
-    'tech': {
-        'channel_id': '@AliTechFinds',
-        'name': 'Tech & Electronics',
-        'active': True,
-        'posting_interval': 180,  # minutes (3 hours) - Specialized channel
-        'min_price': 5,
-        'max_price': 200,
-        'min_commission': 5,
-        'keywords': ['phone', 'headphone', 'bluetooth', 'wireless', 'earphone', 'earbuds',
-                    'cable', 'charger', 'adapter', 'usb', 'smart', 'watch', 'gadget',
-                    'electronic', 'tech', 'pc', 'computer', 'mouse', 'keyboard', 'speaker',
-                    'camera', 'led', 'power bank', 'tablet', 'laptop', 'monitor',
-                    'smartphone', 'android', 'ios', 'iphone', 'samsung', 'xiaomi',
-                    'headset', 'gaming', 'rgb', 'mechanical', 'webcam', 'microphone',
-                    'earphones', 'airpods', 'tws', 'soundbar', 'subwoofer', 'amplifier',
-                    'hub', 'dock', 'converter', 'splitter', 'extension', 'cord',
-                    'lightning', 'type-c', 'micro usb', 'hdmi', 'displayport', 'vga',
-                    'smartwatch', 'fitness', 'tracker', 'band', 'wearable',
-                    'router', 'wifi', 'modem', 'repeater', 'extender', 'network',
-                    'ssd', 'hard drive', 'storage', 'memory', 'ram', 'flash',
-                    'gpu', 'graphics', 'cooling', 'fan', 'radiator', 'thermal',
-                    'controller', 'joystick', 'gamepad', 'console', 'playstation', 'xbox',
-                    'projector', 'tv box', 'streaming', 'media', 'player', 'chromecast',
-                    'drone', 'quadcopter', 'gimbal', 'stabilizer', 'action cam', 'gopro',
-                    'ring light', 'studio', 'lighting', 'tripod', 'mount', 'stand',
-                    'laser', 'pointer', 'presenter', 'remote', 'clicker',
-                    'scanner', 'printer', 'ink', 'toner', 'cartridge',
-                    'telescope', 'microscope', 'binoculars', 'magnifier',
-                    'soldering', 'multimeter', 'oscilloscope', 'tool kit',
-                    'breadboard', 'arduino', 'raspberry pi', 'esp32', 'sensor', 'module',
-                    'battery', 'portable', 'solar', 'generator', 'inverter',
-                    'dashcam', 'car camera', 'parking', 'gps', 'navigator', 'radar',
-                    'bluetooth speaker', 'portable speaker', 'mini speaker', 'bass',
-                    'noise cancelling', 'anc', 'ambient', 'transparency',
-                    'mechanical keyboard', 'backlit', 'macro', 'numpad',
-                    'optical mouse', 'vertical mouse', 'trackball', 'touchpad',
-                    'usb hub', 'card reader', 'otg', 'dongle',
-                    'screen protector', 'tempered glass', 'case', 'cover', 'sleeve',
-                    'stylus', 'pen', 'digital', 'drawing', 'graphics tablet',
-                    'vr', 'virtual reality', 'ar', 'headset', 'glasses',
-                    'smart home', 'automation', 'switch', 'plug', 'bulb', 'strip'],
-        'exclude_keywords': ['fake', 'replica', 'used']
-    },
-    'home': {
-        'channel_id': '@AliHomeEssentials',
-        'name': 'Home, Kitchen & Car Essentials',
-        'active': True,
-        'posting_interval': 195,  # minutes (~3h 15m) - Specialized channel
-        'min_price': 3,
-        'max_price': 150,
-        'min_commission': 4,
-        'keywords': ['home', 'kitchen', 'storage', 'organizer', 'cleaning', 'tool', 'rack',
-                    'holder', 'container', 'basket', 'shelf', 'hook', 'smart home', 'gadget',
-                    'utensil', 'cookware', 'dish', 'bottle', 'cup', 'plate', 'bowl',
-                    'drawer', 'box', 'bin', 'hanger', 'laundry', 'bathroom',
-                    'car', 'vehicle', 'auto', 'dashboard', 'seat', 'steering', 'mirror',
-                    'tire', 'vacuum', 'phone holder', 'charger car', 'air freshener',
-                    'organizer car', 'mat', 'cover', 'accessories car',
-                    # Kitchen expanded
-                    'knife', 'cutting board', 'peeler', 'grater', 'slicer', 'chopper',
-                    'spatula', 'turner', 'ladle', 'whisk', 'tongs', 'masher',
-                    'strainer', 'colander', 'funnel', 'measuring', 'scale', 'timer',
-                    'pot', 'pan', 'wok', 'skillet', 'frying', 'baking',
-                    'oven', 'microwave', 'toaster', 'blender', 'mixer', 'processor',
-                    'kettle', 'teapot', 'coffee', 'espresso', 'french press', 'grinder',
-                    'can opener', 'bottle opener', 'corkscrew', 'jar', 'dispenser',
-                    'food storage', 'lunch box', 'bento', 'thermos', 'insulated',
-                    'cutting mat', 'apron', 'glove', 'mitt', 'trivet', 'coaster',
-                    'sink', 'faucet', 'drain', 'soap', 'sponge', 'scrubber', 'cloth',
-                    'garbage', 'trash', 'waste', 'compost', 'recycling',
-                    # Home expanded
-                    'curtain', 'blind', 'rod', 'drape', 'window', 'shade',
-                    'cushion', 'pillow', 'throw', 'blanket', 'bedding', 'sheet',
-                    'duvet', 'comforter', 'mattress', 'protector', 'topper',
-                    'wardrobe', 'closet', 'cabinet', 'dresser', 'nightstand',
-                    'lamp', 'light', 'bulb', 'fixture', 'chandelier', 'sconce',
-                    'picture frame', 'wall art', 'poster', 'canvas', 'decoration',
-                    'vase', 'plant', 'pot', 'planter', 'watering', 'garden',
-                    'doormat', 'rug', 'carpet', 'floor', 'tiles', 'wood',
-                    'lock', 'handle', 'knob', 'hinge', 'door', 'stopper',
-                    'clock', 'alarm', 'calendar', 'thermometer', 'humidity',
-                    'fan', 'heater', 'humidifier', 'dehumidifier', 'purifier',
-                    'iron', 'ironing board', 'steamer', 'clothes', 'drying',
-                    'hangers', 'clips', 'pegs', 'rope', 'line',
-                    # Cleaning expanded
-                    'mop', 'broom', 'dustpan', 'bucket', 'spray', 'bottle',
-                    'brush', 'duster', 'wipes', 'towel', 'rag', 'microfiber',
-                    'squeegee', 'window cleaner', 'glass', 'polish', 'wax',
-                    'disinfectant', 'sanitizer', 'detergent', 'bleach', 'fabric',
-                    'toilet brush', 'plunger', 'scrub', 'grout', 'tile',
-                    'gloves', 'rubber', 'protective', 'mask', 'safety',
-                    # Bathroom expanded
-                    'shower', 'bath', 'tub', 'curtain', 'liner', 'hooks',
-                    'towel rack', 'bar', 'ring', 'tissue', 'paper', 'holder',
-                    'soap dish', 'dispenser', 'toothbrush', 'holder', 'cup',
-                    'mirror', 'cabinet', 'shelf', 'organizer', 'caddy', 'basket',
-                    'mat', 'rug', 'non-slip', 'suction', 'adhesive',
-                    'drain cover', 'hair catcher', 'filter', 'strainer',
-                    'shampoo', 'conditioner', 'body wash', 'lotion', 'cream',
-                    'razor', 'shaving', 'trimmer', 'scissors', 'nail',
-                    'scale', 'weighing', 'digital', 'analog', 'mechanical',
-                    # Car expanded
-                    'sunshade', 'visor', 'windshield', 'window', 'tint',
-                    'seat cover', 'cushion', 'lumbar', 'neck', 'pillow',
-                    'steering wheel', 'grip', 'wrap', 'leather', 'cover',
-                    'phone mount', 'holder', 'magnetic', 'suction', 'clip',
-                    'charger', 'usb', 'adapter', 'cigarette', 'lighter', 'socket',
-                    'air freshener', 'perfume', 'diffuser', 'vent', 'clip',
-                    'organizer', 'trunk', 'backseat', 'storage', 'net', 'bag',
-                    'trash bin', 'garbage', 'waste', 'bucket', 'container',
-                    'cleaning', 'wash', 'sponge', 'cloth', 'towel', 'chamois',
-                    'wax', 'polish', 'shine', 'tire', 'wheel', 'rim',
-                    'dash cam', 'camera', 'recorder', 'dvr', 'parking',
-                    'sensor', 'radar', 'detector', 'alarm', 'security',
-                    'floor mat', 'carpet', 'rubber', 'weather', 'proof',
-                    'sun visor', 'cd holder', 'tissue box', 'coin holder'],
-        'exclude_keywords': ['fake', 'used', 'broken']
-    },
-    'beauty': {
-        'channel_id': '@MissRedExpress',
-        'name': 'Beauty & Fashion',
-        'active': True,
-        'posting_interval': 210,  # minutes (~3h 30m) - Specialized channel
-        'min_price': 2,
-        'max_price': 100,
-        'min_commission': 5,
-        'keywords': ['makeup', 'beauty', 'cosmetic', 'skincare', 'lipstick', 'eyeshadow',
-                    'foundation', 'perfume', 'nail', 'jewelry', 'necklace', 'earring',
-                    'bracelet', 'ring', 'fashion', 'accessory', 'bag', 'scarf', 'hair',
-                    'brush', 'mirror', 'women', 'girl', 'lady', 'elegant', 'style',
-                    # Makeup expanded
-                    'mascara', 'eyeliner', 'eyebrow', 'brow', 'pencil', 'gel',
-                    'blush', 'bronzer', 'highlighter', 'contour', 'palette',
-                    'primer', 'concealer', 'powder', 'setting', 'finishing',
-                    'lip gloss', 'lip liner', 'lip stain', 'lip balm', 'tint',
-                    'lashes', 'false lashes', 'eyelash', 'curler', 'glue',
-                    'makeup remover', 'cleansing', 'wipes', 'micellar', 'oil',
-                    'sponge', 'beauty blender', 'applicator', 'puff', 'brush set',
-                    'makeup bag', 'organizer', 'case', 'storage', 'travel',
-                    # Skincare expanded
-                    'cleanser', 'face wash', 'foam', 'gel', 'cream', 'oil',
-                    'toner', 'essence', 'serum', 'ampoule', 'treatment',
-                    'moisturizer', 'lotion', 'emulsion', 'day cream', 'night cream',
-                    'eye cream', 'eye mask', 'patch', 'under eye', 'dark circle',
-                    'face mask', 'sheet mask', 'clay mask', 'peel off', 'wash off',
-                    'exfoliator', 'scrub', 'peeling', 'aha', 'bha', 'enzyme',
-                    'sunscreen', 'spf', 'sun protection', 'uv', 'pa',
-                    'vitamin c', 'retinol', 'hyaluronic', 'niacinamide', 'peptide',
-                    'acne', 'pimple', 'blemish', 'spot', 'treatment',
-                    'anti-aging', 'wrinkle', 'firming', 'lifting', 'tightening',
-                    'whitening', 'brightening', 'glow', 'radiant', 'luminous',
-                    'pore', 'minimizer', 'refining', 'blackhead', 'nose strip',
-                    # Hair care
-                    'shampoo', 'conditioner', 'hair mask', 'treatment', 'oil',
-                    'hair spray', 'gel', 'wax', 'mousse', 'styling',
-                    'hair dryer', 'blow dryer', 'straightener', 'curler', 'iron',
-                    'comb', 'hairbrush', 'detangler', 'wide tooth', 'paddle',
-                    'hair tie', 'elastic', 'scrunchie', 'headband', 'clip',
-                    'hair pins', 'bobby pins', 'barrette', 'hairpin', 'accessories',
-                    'hair color', 'dye', 'bleach', 'toner', 'developer',
-                    'hair extensions', 'wig', 'toupee', 'hairpiece', 'clip-in',
-                    # Nail care
-                    'nail polish', 'lacquer', 'varnish', 'gel', 'shellac',
-                    'nail art', 'stickers', 'decals', 'rhinestones', 'gems',
-                    'nail file', 'buffer', 'clipper', 'cutter', 'trimmer',
-                    'cuticle', 'pusher', 'nipper', 'oil', 'cream',
-                    'base coat', 'top coat', 'primer', 'sealer', 'finish',
-                    'nail remover', 'acetone', 'polish remover', 'wipes',
-                    'manicure', 'pedicure', 'kit', 'set', 'tools',
-                    'artificial nails', 'fake nails', 'press on', 'acrylic', 'tips',
-                    # Jewelry expanded
-                    'pendant', 'chain', 'choker', 'collar', 'locket',
-                    'stud', 'hoop', 'dangle', 'drop', 'chandelier',
-                    'bangle', 'cuff', 'charm', 'anklet', 'ankle bracelet',
-                    'engagement', 'wedding', 'band', 'promise', 'eternity',
-                    'birthstone', 'crystal', 'diamond', 'pearl', 'gemstone',
-                    'gold', 'silver', 'rose gold', 'platinum', 'stainless steel',
-                    'jewelry box', 'organizer', 'stand', 'holder', 'display',
-                    'watch', 'smartwatch', 'bracelet', 'band', 'strap',
-                    # Fashion accessories
-                    'handbag', 'purse', 'clutch', 'tote', 'shoulder bag',
-                    'crossbody', 'messenger', 'backpack', 'satchel', 'hobo',
-                    'wallet', 'coin purse', 'cardholder', 'money clip', 'pouch',
-                    'belt', 'waist', 'leather', 'buckle', 'chain',
-                    'sunglasses', 'eyeglasses', 'glasses', 'frames', 'shades',
-                    'hat', 'cap', 'beanie', 'beret', 'fedora', 'panama',
-                    'scarf', 'shawl', 'wrap', 'stole', 'pashmina', 'bandana',
-                    'gloves', 'mittens', 'fingerless', 'winter', 'leather',
-                    'socks', 'stockings', 'tights', 'leggings', 'pantyhose',
-                    # Perfume & fragrance
-                    'perfume', 'cologne', 'fragrance', 'eau de parfum', 'edp',
-                    'eau de toilette', 'body spray', 'mist', 'deodorant',
-                    'essential oil', 'aromatherapy', 'diffuser', 'roller',
-                    # Body care
-                    'body lotion', 'body cream', 'body butter', 'moisturizer',
-                    'body scrub', 'exfoliator', 'body polish', 'salt scrub',
-                    'body wash', 'shower gel', 'soap', 'bath', 'bubble',
-                    'hand cream', 'hand lotion', 'cuticle cream', 'nail care',
-                    'foot cream', 'foot mask', 'heel balm', 'callus remover',
-                    'massage oil', 'body oil', 'dry oil', 'shimmer'],
-        'exclude_keywords': ['fake', 'men', 'boy', 'replica']
-    },
-    'under10': {
-        'channel_id': '@AliUnder10Deals',
-        'name': 'Under $10 Deals',
-        'active': True,
-        'posting_interval': 130,  # minutes (~2h 10m) - Fast channel
-        'min_price': 0,  # Don't filter min in API, filter in code instead
-        'max_price': 10,
-        'min_commission': 2,
-        # Use generic popular keywords to get results, then filter by price
-        'keywords': ['phone', 'case', 'cable', 'holder', 'jewelry', 'ring', 'bracelet',
-                    'earring', 'bag', 'wallet', 'key', 'toy', 'tool', 'led', 'sticker',
-                    'nail', 'makeup', 'brush', 'pen', 'notebook', 'clip', 'hook',
-                    # Phone accessories
-                    'phone case', 'cover', 'silicone', 'tpu', 'bumper', 'clear',
-                    'tempered glass', 'screen protector', 'film', 'guard',
-                    'usb cable', 'charging', 'charger', 'adapter', 'plug',
-                    'car holder', 'mount', 'stand', 'grip', 'ring holder',
-                    'earphones', 'earbuds', 'headphones', 'aux', 'jack',
-                    'selfie stick', 'tripod', 'remote', 'shutter', 'bluetooth',
-                    # Jewelry & accessories
-                    'necklace', 'pendant', 'chain', 'choker', 'locket',
-                    'earrings', 'studs', 'hoops', 'dangle', 'drop',
-                    'bracelet', 'bangle', 'cuff', 'anklet', 'charm',
-                    'rings', 'band', 'adjustable', 'midi', 'knuckle',
-                    'brooch', 'pin', 'badge', 'button', 'patch',
-                    'hair accessories', 'hair tie', 'scrunchie', 'clip', 'pin',
-                    'headband', 'elastic', 'bow', 'ribbon', 'flower',
-                    # Fashion accessories
-                    'sunglasses', 'glasses', 'shades', 'frames', 'retro',
-                    'watch', 'wristwatch', 'digital', 'analog', 'strap',
-                    'belt', 'waist belt', 'elastic belt', 'buckle', 'chain',
-                    'socks', 'ankle socks', 'crew', 'no show', 'cotton',
-                    'gloves', 'mittens', 'winter', 'fingerless', 'touchscreen',
-                    'hat', 'cap', 'beanie', 'snapback', 'baseball',
-                    'scarf', 'bandana', 'headscarf', 'neck warmer', 'infinity',
-                    # Bags & wallets
-                    'coin purse', 'small wallet', 'cardholder', 'card case', 'pouch',
-                    'keychain', 'key ring', 'key holder', 'key organizer', 'carabiner',
-                    'tote bag', 'shopping bag', 'canvas', 'reusable', 'foldable',
-                    'makeup bag', 'cosmetic bag', 'travel pouch', 'organizer', 'zipper',
-                    # Beauty & personal care
-                    'lipstick', 'lip gloss', 'lip balm', 'lip tint', 'lip liner',
-                    'eyeliner', 'mascara', 'eyebrow pencil', 'brow gel', 'lashes',
-                    'makeup sponge', 'beauty blender', 'puff', 'applicator', 'brush',
-                    'nail polish', 'nail art', 'stickers', 'decals', 'gems',
-                    'nail file', 'buffer', 'clipper', 'cuticle pusher', 'tweezers',
-                    'face mask', 'sheet mask', 'eye mask', 'nose strip', 'patch',
-                    'hair clip', 'claw clip', 'bobby pins', 'barrette', 'hairpin',
-                    'shower cap', 'bath sponge', 'loofah', 'body scrubber', 'pumice',
-                    'razor', 'shaver', 'trimmer', 'eyebrow razor', 'facial razor',
-                    # Home & kitchen
-                    'sponge', 'scrubber', 'dish cloth', 'cleaning cloth', 'wipes',
-                    'clips', 'clothespins', 'pegs', 'binder clips', 'paper clips',
-                    'hooks', 'adhesive hooks', 'wall hooks', 'suction hooks', 'hangers',
-                    'bag clips', 'seal clips', 'food clips', 'chip clips', 'sealer',
-                    'coaster', 'drink coaster', 'mat', 'placemat', 'table mat',
-                    'bottle opener', 'can opener', 'jar opener', 'lid opener', 'cork',
-                    'straw', 'reusable straw', 'silicone straw', 'metal straw', 'brush',
-                    'ice cube tray', 'mold', 'popsicle', 'ice maker', 'frozen',
-                    'tea infuser', 'strainer', 'filter', 'ball', 'mesh',
-                    'measuring spoon', 'cup', 'scoop', 'funnel', 'dropper',
-                    # Stationery & office
-                    'pen', 'ballpoint', 'gel pen', 'marker', 'highlighter',
-                    'pencil', 'mechanical pencil', 'lead', 'eraser', 'sharpener',
-                    'notebook', 'notepad', 'sticky notes', 'memo', 'post-it',
-                    'bookmark', 'page marker', 'ruler', 'tape', 'glue',
-                    'scissors', 'cutter', 'stapler', 'staples', 'remover',
-                    # Electronics
-                    'led light', 'keychain light', 'mini light', 'flashlight', 'torch',
-                    'usb', 'otg', 'adapter', 'converter', 'splitter',
-                    'cable organizer', 'cord holder', 'wire manager', 'clips', 'ties',
-                    'battery', 'aaa', 'aa', 'button cell', 'coin battery',
-                    # Toys & entertainment
-                    'fidget', 'spinner', 'cube', 'toy', 'stress relief',
-                    'puzzle', 'brain teaser', 'game', 'cards', 'dice',
-                    'balloon', 'party', 'decoration', 'banner', 'confetti',
-                    'stickers', 'decals', 'tattoo', 'temporary', 'transfer',
-                    # Tools & hardware
-                    'screwdriver', 'bit', 'allen key', 'hex', 'wrench',
-                    'tape measure', 'ruler', 'level', 'laser', 'pointer',
-                    'magnet', 'magnetic', 'strip', 'hook', 'holder',
-                    # Pet accessories
-                    'pet toy', 'cat toy', 'dog toy', 'ball', 'feather',
-                    'collar', 'leash', 'harness', 'tag', 'id',
-                    'bowl', 'feeder', 'water', 'food', 'dish'],
-        'exclude_keywords': ['fake', 'replica', 'broken', 'used']
-    },
-    'under5': {
-        'channel_id': '@AliUnder5Deals',
-        'name': 'Under $5 Deals',
-        'active': True,
-        'posting_interval': 110,  # minutes (~1h 50m) - Fast channel
-        'min_price': 0,  # Don't filter min in API, filter in code instead
-        'max_price': 5,
-        'min_commission': 1,
-        # Use small/cheap item keywords
-        'keywords': ['sticker', 'ring', 'earring', 'bracelet', 'nail', 'clip', 'hook',
-                    'keychain', 'charm', 'button', 'patch', 'tape', 'pen', 'eraser',
-                    'bookmark', 'magnet', 'badge', 'pin', 'cable tie', 'led',
-                    # Jewelry & accessories (cheap)
-                    'earrings', 'studs', 'small ring', 'toe ring', 'midi ring',
-                    'anklet', 'ankle bracelet', 'friendship bracelet', 'string bracelet',
-                    'brooch', 'safety pin', 'decorative pin', 'enamel pin',
-                    'hair elastic', 'hair tie', 'rubber band', 'scrunchie mini',
-                    'bobby pin', 'hair pin', 'clip small', 'mini barrette',
-                    # Stickers & decals
-                    'sticker pack', 'vinyl sticker', 'waterproof sticker', 'laptop sticker',
-                    'phone sticker', 'nail sticker', 'nail decal', 'nail art',
-                    'wall sticker', 'car sticker', 'emoji sticker', 'cute sticker',
-                    'temporary tattoo', 'transfer', 'body sticker', 'face sticker',
-                    # Keychains & charms
-                    'key ring', 'key holder', 'key tag', 'key label',
-                    'mini keychain', 'cute keychain', 'animal keychain', 'cartoon',
-                    'charm', 'pendant charm', 'bag charm', 'zipper pull',
-                    'phone charm', 'dust plug', 'jack plug', 'earphone plug',
-                    # Nail care
-                    'nail file', 'emery board', 'buffer', 'mini buffer',
-                    'cuticle pusher', 'cuticle stick', 'orange stick', 'wood stick',
-                    'nail sticker', 'nail gem', 'rhinestone', 'nail decoration',
-                    'toe separator', 'nail spacer', 'pedicure tool', 'toe spreader',
-                    # Beauty samples & minis
-                    'lip balm', 'lip gloss mini', 'sample', 'travel size',
-                    'makeup sample', 'perfume sample', 'tester', 'mini bottle',
-                    'cotton pad', 'cotton swab', 'q-tip', 'makeup remover pad',
-                    'blotting paper', 'oil control', 'face paper', 'tissue',
-                    'eyebrow razor', 'facial razor', 'mini razor', 'shaver',
-                    'makeup sponge', 'mini sponge', 'puff', 'small applicator',
-                    # Hair accessories (cheap)
-                    'hair band', 'headband thin', 'elastic band', 'ponytail holder',
-                    'mini clip', 'claw clip mini', 'butterfly clip', 'snap clip',
-                    'hair ribbon', 'bow', 'mini bow', 'hair bow',
-                    # Office & stationery (cheap)
-                    'ballpoint pen', 'gel pen', 'pencil', 'mini pencil',
-                    'eraser', 'rubber', 'pencil eraser', 'mini eraser',
-                    'sharpener', 'pencil sharpener', 'double hole', 'single',
-                    'paper clip', 'metal clip', 'colored clip', 'mini clip',
-                    'binder clip', 'mini binder', 'small clip', 'foldback',
-                    'pushpin', 'thumbtack', 'drawing pin', 'bulletin board',
-                    'sticky note', 'post-it small', 'memo pad', 'mini notepad',
-                    'bookmark', 'page clip', 'page marker', 'book mark',
-                    'rubber band', 'elastic band', 'hair tie', 'office band',
-                    # Small tools & hardware
-                    'cable tie', 'zip tie', 'wire tie', 'plastic tie',
-                    'cable clip', 'cord organizer', 'wire clip', 'adhesive clip',
-                    'suction cup', 'hook small', 'mini hook', 'adhesive hook',
-                    'magnet', 'mini magnet', 'fridge magnet', 'magnetic strip',
-                    'velcro', 'hook loop', 'adhesive velcro', 'sticky back',
-                    'safety pin', 'diaper pin', 'sewing pin', 'straight pin',
-                    'needle', 'sewing needle', 'hand needle', 'embroidery',
-                    'thread', 'sewing thread', 'cotton thread', 'polyester',
-                    'button', 'snap button', 'press stud', 'fastener',
-                    # Electronics accessories (cheap)
-                    'cable protector', 'cord saver', 'cable cover', 'spring',
-                    'earphone holder', 'cord wrap', 'cable winder', 'organizer',
-                    'dust plug', 'port cover', 'phone plug', 'dust cap',
-                    'sim card', 'adapter', 'sim tool', 'ejector pin',
-                    'screen wipe', 'cleaning cloth', 'microfiber small', 'lens cloth',
-                    # Home & kitchen (cheap)
-                    'bag clip', 'food clip', 'seal clip', 'chip clip',
-                    'clothespin', 'peg', 'clothes peg', 'hanging clip',
-                    'sponge', 'mini sponge', 'scrubber small', 'dish sponge',
-                    'drain cover', 'sink strainer', 'filter', 'hair catcher',
-                    'soap dish', 'soap holder', 'travel soap', 'soap case',
-                    'ice cube tray', 'mini tray', 'small mold', 'ice mold',
-                    'toothpick', 'dental pick', 'floss pick', 'oral care',
-                    'straw', 'mini straw', 'cocktail straw', 'short straw',
-                    # Craft & DIY
-                    'beads', 'craft bead', 'plastic bead', 'glass bead',
-                    'sequin', 'glitter', 'craft supply', 'decoration',
-                    'ribbon', 'craft ribbon', 'satin ribbon', 'grosgrain',
-                    'lace', 'trim', 'fabric trim', 'decorative trim',
-                    'felt', 'craft felt', 'fabric square', 'diy material',
-                    # Travel & portable
-                    'pill box', 'pill case', 'medicine box', 'vitamin case',
-                    'contact lens case', 'lens holder', 'travel case', 'mini case',
-                    'mini bottle', 'travel bottle', 'small container', 'sample jar',
-                    'luggage tag', 'bag tag', 'id tag', 'name tag',
-                    # Party & celebration
-                    'balloon', 'mini balloon', 'party balloon', 'latex balloon',
-                    'candle', 'birthday candle', 'cake candle', 'party candle',
-                    'confetti', 'party confetti', 'table confetti', 'sprinkle',
-                    'party favor', 'goodie bag', 'gift bag small', 'treat bag',
-                    # Miscellaneous
-                    'mirror', 'mini mirror', 'pocket mirror', 'compact mirror',
-                    'comb', 'mini comb', 'pocket comb', 'folding comb',
-                    'whistle', 'mini whistle', 'keychain whistle', 'sport whistle',
-                    'dice', 'game dice', 'd6', 'small dice'],
-        'exclude_keywords': ['fake', 'replica', 'broken', 'used']
-    }
-}
+# Webhook mode - admin updates are pushed by Telegram instead of polled (unset WEBHOOK_URL = long polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # public https URL Telegram posts updates to
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)  # checked on every request
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443')))
+WEBHOOK_REGISTER = os.getenv('WEBHOOK_REGISTER', '1') != '0'  # 0 = only start the receiver (local testing)
 
-# Global bot settings
-BOT_SETTINGS = {
-    'active': True
-}
+# Posting cycle settings
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '4'))  # parallel AliExpress queries per cycle
+
+# Multi-worker mode - WORKER_COUNT processes share STATE_DB_PATH and each one posts its own channels
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
+WORKER_ID = int(os.getenv('WORKER_ID', '0'))  # 0 .. WORKER_COUNT - 1
+WORKER_CHANNELS = frozenset(key.strip() for key in os.getenv('WORKER_CHANNELS', '').split(',') if key.strip())  # overrides hashing
+POST_CLAIM_TTL = 10 * 60  # seconds before the claim of a crashed worker on a product expires
+SETTINGS_REFRESH_INTERVAL = 5  # seconds shared settings are cached by a worker
+LEADER_RETRY_INTERVAL = 30  # seconds between attempts of a follower to become the admin leader
+if not 0 <= WORKER_ID < WORKER_COUNT:
+    raise SystemExit(f"WORKER_ID must be between 0 and {WORKER_COUNT - 1}")
+
+# Scheduler settings - every channel runs as its own job on its own interval
+MIN_POSTING_INTERVAL = 15  # minutes - never post more often than this
+SCHEDULE_JITTER = 300  # seconds - random +/- shift applied to every run
+FIRST_RUN_DELAY_RANGE = (20, 60)  # seconds before the first channel posts
+CHANNEL_STAGGER = 90  # seconds between the first runs of consecutive channels
+
+# Channel definitions - validated from channels.json, hot-reloaded, admin edits are written back
+CHANNELS_CONFIG_PATH = os.getenv('CHANNELS_CONFIG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'channels.json'))
+CHANNELS_RELOAD_INTERVAL = 30  # seconds between checks of the channels file for changes
+
+# Metrics - in-process registry, served as Prometheus text on /metrics and summarized on the stats screen
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 = no /metrics endpoint
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag samples
+
+class MetricCounter:
+    """Monotonic counter with optional labels"""
+    kind = 'counter'
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: Dict[tuple, float] = defaultdict(float)
+    
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] += amount
+    
+    def value(self, *label_values) -> float:
+        return self.values.get(label_values, 0.0)
+    
+    def total(self) -> float:
+        return sum(self.values.values())
+    
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, label_values, value
+
+class MetricGauge(MetricCounter):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+    kind = 'gauge'
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self.func = func
+    
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+    
+    def samples(self):
+        if self.func is not None:
+            yield self.name, (), self.func()
+        else:
+            yield from super().samples()
 
-# Track posted products to avoid duplicates
-POSTED_PRODUCTS = set()  # Store product IDs
+class MetricHistogram:
+    """Latency histogram with fixed buckets (cumulative on export)"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.counts: Dict[tuple, List[int]] = {}
+        self.sums: Dict[tuple, float] = defaultdict(float)
+        self.maxima: Dict[tuple, float] = defaultdict(float)
+    
+    def observe(self, value: float, *label_values):
+        counts = self.counts.get(label_values)
+        if counts is None:
+            counts = self.counts[label_values] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[label_values] += value
+        self.maxima[label_values] = max(self.maxima[label_values], value)
+    
+    def time(self, *label_values) -> 'MetricTimer':
+        return MetricTimer(self, label_values)
+    
+    def count(self, *label_values) -> int:
+        if label_values:
+            return sum(self.counts.get(label_values, ()))
+        return sum(sum(counts) for counts in self.counts.values())
+    
+    def quantile(self, q: float, *label_values) -> Optional[float]:
+        """Approximate quantile (upper bound of the bucket holding it), all label sets merged when none given"""
+        if label_values:
+            merged = self.counts.get(label_values)
+            maximum = self.maxima.get(label_values, 0.0)
+        else:
+            merged = [sum(column) for column in zip(*self.counts.values())] if self.counts else None
+            maximum = max(self.maxima.values(), default=0.0)
+        if not merged or not sum(merged):
+            return None
+        rank = q * sum(merged)
+        seen = 0
+        for index, bucket_count in enumerate(merged):
+            seen += bucket_count
+            if seen >= rank and index < len(self.buckets):
+                return min(self.buckets[index], maximum)
+        return maximum
+    
+    def samples(self):
+        for label_values, counts in self.counts.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', label_values + (('le', f'{bound:g}'),), cumulative
+            yield f'{self.name}_bucket', label_values + (('le', '+Inf'),), cumulative + counts[-1]
+            yield f'{self.name}_sum', label_values, self.sums[label_values]
+            yield f'{self.name}_count', label_values, cumulative + counts[-1]
+
+class MetricTimer:
+    """Context manager observing the elapsed time into a histogram"""
+    __slots__ = ('histogram', 'label_values', 'started')
+    
+    def __init__(self, histogram: MetricHistogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+class MetricsRegistry:
+    """All bot metrics plus collectors that export existing counters at scrape time"""
+    
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.collectors: List[Callable] = []
+    
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> MetricCounter:
+        return self._register(MetricCounter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: tuple = (), func: Optional[Callable[[], float]] = None) -> MetricGauge:
+        return self._register(MetricGauge(name, help_text, labels, func))
+    
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> MetricHistogram:
+        return self._register(MetricHistogram(name, help_text, labels, buckets))
+    
+    def collector(self, func: Callable):
+        """Register func() -> iterable of (name, kind, help, labels, [(label_values, value)])"""
+        self.collectors.append(func)
+        return func
+    
+    @staticmethod
+    def _format_labels(labels: tuple, label_values: tuple) -> str:
+        pairs = []
+        for index, value in enumerate(label_values):
+            # Histogram buckets append ('le', bound) to the label values
+            name, value = value if isinstance(value, tuple) else (labels[index], value)
+            escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{name}="{escaped}"')
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+    
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, label_values, value in metric.samples():
+                lines.append(f'{name}{self._format_labels(metric.labels, label_values)} {value:g}')
+        for collect in self.collectors:
+            for name, kind, help_text, labels, samples in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for label_values, value in samples:
+                    lines.append(f'{name}{self._format_labels(labels, label_values)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+METRICS = MetricsRegistry()
+ALIEXPRESS_LATENCY = METRICS.histogram('aliexpress_request_seconds', 'AliExpress API request latency', ('outcome',))
+ALIEXPRESS_ERRORS = METRICS.counter('aliexpress_errors_total', 'Failed AliExpress API requests', ('code',))
+ALIEXPRESS_RETRIES_TOTAL = METRICS.counter('aliexpress_retries_total', 'AliExpress requests retried after a transient failure', ('code',))
+ALIEXPRESS_HEDGES = METRICS.counter('aliexpress_hedged_requests_total', 'Slow AliExpress requests raced by a second copy')
+SHORTENER_LATENCY = METRICS.histogram('shortener_request_seconds', 'Link shortener backend latency', ('outcome',))
+TELEGRAM_API_LATENCY = METRICS.histogram('telegram_api_seconds', 'Telegram Bot API call latency', ('method',))
+TELEGRAM_SEND_LATENCY = METRICS.histogram('telegram_send_seconds', 'Telegram send latency including queueing and retries', ('method',))
+TELEGRAM_RETRY_AFTER = METRICS.counter('telegram_retry_after_total', 'RetryAfter flood-limit answers from Telegram')
+TELEGRAM_RETRY_AFTER_WAIT = METRICS.counter('telegram_retry_after_seconds_total', 'Seconds waited because of RetryAfter')
+CYCLE_DURATION = METRICS.histogram('posting_cycle_seconds', 'Duration of a posting cycle (fetch, select, shorten, post)')
+POSTS_TOTAL = METRICS.counter('posts_total', 'Products posted', ('channel',))
+PHOTO_SENDS = METRICS.counter('product_posts_by_media_total', 'Product posts by media source', ('source',))
+KEYWORD_FALLBACKS = METRICS.counter('keyword_fallbacks_total', 'Keyword queries that found nothing and fell back to trending', ('channel',))
+LOOP_LAG = METRICS.histogram('event_loop_lag_seconds', 'Event loop scheduling delay',
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL):
+    """Sample how late the event loop wakes up - blocking code shows up as lag"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '—'
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def metrics_summary() -> str:
+    """Short performance summary for the admin stats screen"""
+    def percentiles(histogram: MetricHistogram) -> str:
+        return f"p50 {format_duration(histogram.quantile(0.5))} / p95 {format_duration(histogram.quantile(0.95))}"
+    
+    return f"""⏱️ **الأداء:**
+• AliExpress: {percentiles(ALIEXPRESS_LATENCY)} ({ALIEXPRESS_LATENCY.count()} طلب، {ALIEXPRESS_ERRORS.total():g} خطأ)
+• إرسال تيليجرام: {percentiles(TELEGRAM_SEND_LATENCY)}
+• RetryAfter: {TELEGRAM_RETRY_AFTER.total():g} مرة ({TELEGRAM_RETRY_AFTER_WAIT.total():g}ث انتظار)
+• اختصار الروابط: {percentiles(SHORTENER_LATENCY)}
+• دورة النشر: {percentiles(CYCLE_DURATION)} ({CYCLE_DURATION.count()} دورة)
+• تأخر الحلقة: p95 {format_duration(LOOP_LAG.quantile(0.95))}، أقصى {format_duration(max(LOOP_LAG.maxima.values(), default=None))}"""
+
+async def handle_metrics_request(method: str, headers: Dict[str, str], body: bytes):
+    """Prometheus scrape endpoint"""
+    if method not in ('GET', 'HEAD'):
+        return 405, b'', 'text/plain'
+    return 200, METRICS.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+
+# Local state database (duplicate history and other persistent bot state)
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'bot_state.db')
+
+# Duplicate history settings
 MAX_POSTED_HISTORY = 1000  # Maximum products to remember
+POSTED_HISTORY_TTL = int(os.getenv('POSTED_HISTORY_TTL', '0'))  # seconds, 0 = only evict by size
+HISTORY_FLUSH_BATCH = 20  # pending changes written to disk in one transaction
 
-class AliExpressAPI:
-    """Handler for AliExpress Affiliates API"""
+def open_state_db(path: str) -> sqlite3.Connection:
+    """Open the local state database"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class PostedHistory:
+    """Duplicate history with oldest-first eviction and optional TTL, persisted to SQLite"""
     
-    def __init__(self, app_key: str, app_secret: str):
-        self.app_key = app_key
-        self.app_secret = app_secret
-        self.api_url = ALIEXPRESS_API_URL
+    def __init__(self, db_path: str, max_size: int, ttl: int = 0, flush_batch: int = HISTORY_FLUSH_BATCH,
+                 shared: bool = False):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_batch = flush_batch
+        self.shared = shared  # other worker processes post from the same database
+        self._items: 'OrderedDict[str, float]' = OrderedDict()  # product_id -> posted_at, oldest first
+        self._pending_upserts: Dict[str, float] = {}
+        self._pending_deletes = set()
+        
+        self._conn = open_state_db(db_path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS posted_products (product_id TEXT PRIMARY KEY, posted_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS post_claims (product_id TEXT PRIMARY KEY, claimed_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        self._load()
     
-    def _generate_sign(self, params: Dict[str, str]) -> str:
-        """Generate signature for AliExpress API request"""
-        # Sort all parameters alphabetically
-        sorted_params = sorted(params.items())
+    def _load(self):
+        """Load history from disk in posting order, dropping expired and overflow entries"""
+        rows = self._conn.execute('SELECT product_id, posted_at FROM posted_products ORDER BY posted_at').fetchall()
+        cutoff = time.time() - self.ttl if self.ttl else None
+        for product_id, posted_at in rows:
+            if cutoff is not None and posted_at < cutoff:
+                self._pending_deletes.add(product_id)
+                continue
+            self._items[product_id] = posted_at
+        self._evict_overflow()
+        self.flush()
+        logger.info("Loaded %d products from duplicate history", len(self._items))
+    
+    def _evict_overflow(self):
+        while len(self._items) > self.max_size:
+            product_id, _ = self._items.popitem(last=False)
+            self._pending_upserts.pop(product_id, None)
+            self._pending_deletes.add(product_id)
+    
+    def __contains__(self, product_id) -> bool:
+        key = str(product_id)
+        posted_at = self._items.get(key)
+        if posted_at is None:
+            return False
+        if self.ttl and time.time() - posted_at > self.ttl:
+            del self._items[key]
+            self._pending_upserts.pop(key, None)
+            self._pending_deletes.add(key)
+            return False
+        return True
+    
+    def __len__(self) -> int:
+        return len(self._items)
+    
+    def add(self, product_id):
+        """Record a posted product (re-adding moves it to the newest position)"""
+        key = str(product_id)
+        now = time.time()
+        self._items[key] = now
+        self._items.move_to_end(key)
+        self._pending_upserts[key] = now
+        self._pending_deletes.discard(key)
+        self._evict_overflow()
+        if len(self._pending_upserts) + len(self._pending_deletes) >= self.flush_batch:
+            self.flush()
+    
+    def clear(self):
+        """Forget every posted product (admin reset)"""
+        self._items.clear()
+        self._pending_upserts.clear()
+        self._pending_deletes.clear()
+        self._conn.execute('DELETE FROM posted_products')
+        self._conn.commit()
+    
+    def sync(self):
+        """Replace the in-memory history with the shared table - picks up other workers' posts and resets"""
+        if not self.shared:
+            return
+        self.flush()
+        try:
+            rows = self._conn.execute('SELECT product_id, posted_at FROM posted_products ORDER BY posted_at').fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error reading shared duplicate history: %s", e)
+            return
+        self._items = OrderedDict(rows)
+        self._evict_overflow()
+    
+    def claim(self, product_id) -> bool:
+        """Reserve a product for posting - False if another worker posted it or is posting it"""
+        if not self.shared:
+            return True
+        key = str(product_id)
+        now = time.time()
+        try:
+            with self._conn:
+                if self._conn.execute('SELECT 1 FROM posted_products WHERE product_id = ?', (key,)).fetchone():
+                    self._items.setdefault(key, now)
+                    return False
+                self._conn.execute('DELETE FROM post_claims WHERE claimed_at < ?', (now - POST_CLAIM_TTL,))
+                cursor = self._conn.execute('INSERT OR IGNORE INTO post_claims (product_id, claimed_at) VALUES (?, ?)', (key, now))
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logger.error("Error claiming product %s: %s", key, e)
+            return False
+    
+    def release(self, product_id):
+        """End a claim - a posted product is written to the shared history first"""
+        if not self.shared:
+            return
+        self.flush()
+        try:
+            with self._conn:
+                self._conn.execute('DELETE FROM post_claims WHERE product_id = ?', (str(product_id),))
+        except sqlite3.Error as e:
+            logger.error("Error releasing product claim: %s", e)
+    
+    def flush(self):
+        """Write pending changes to disk in a single transaction"""
+        if not self._pending_upserts and not self._pending_deletes:
+            return
+        try:
+            with self._conn:
+                if self._pending_deletes:
+                    self._conn.executemany('DELETE FROM posted_products WHERE product_id = ?',
+                                           [(key,) for key in self._pending_deletes])
+                if self._pending_upserts:
+                    self._conn.executemany('INSERT OR REPLACE INTO posted_products (product_id, posted_at) VALUES (?, ?)',
+                                           list(self._pending_upserts.items()))
+            self._pending_upserts.clear()
+            self._pending_deletes.clear()
+        except sqlite3.Error as e:
+            logger.error("Error saving duplicate history: %s", e)
+    
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+class SharedSettings:
+    """Bot settings stored in the state database, so every worker sees the admin's changes"""
+    
+    def __init__(self, db_path: str, defaults: Dict):
+        self._values = dict(defaults)
+        self._refreshed_at = 0.0
+        self._conn = open_state_db(db_path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS bot_settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._conn.commit()
+    
+    def _refresh(self):
+        if time.monotonic() - self._refreshed_at < SETTINGS_REFRESH_INTERVAL:
+            return
+        try:
+            self._values.update((name, json.loads(value)) for name, value in self._conn.execute('SELECT name, value FROM bot_settings'))
+        except sqlite3.Error as e:
+            logger.error("Error reading shared settings: %s", e)
+        self._refreshed_at = time.monotonic()
+    
+    def __getitem__(self, name: str):
+        self._refresh()
+        return self._values[name]
+    
+    def __setitem__(self, name: str, value):
+        self._values[name] = value
+        try:
+            with self._conn:
+                self._conn.execute('INSERT OR REPLACE INTO bot_settings (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+        except sqlite3.Error as e:
+            logger.error("Error saving shared settings: %s", e)
+    
+    def close(self):
+        self._conn.close()
+
+# Global bot settings (shared by all workers, survive restarts)
+BOT_SETTINGS = SharedSettings(STATE_DB_PATH, {'active': True})
+
+# Track posted products to avoid duplicates (survives restarts, shared by all workers)
+POSTED_PRODUCTS = PostedHistory(STATE_DB_PATH, MAX_POSTED_HISTORY, ttl=POSTED_HISTORY_TTL, shared=WORKER_COUNT > 1)
+POSTS_IN_FLIGHT = set()  # products being posted right now (another channel may hold the same one)
+
+class KeywordMatcher:
+    """Compiled multi-keyword substring matcher (one trie-shaped regex per keyword list)"""
+    
+    def __init__(self, keywords: List[str]):
+        # Normalize and deduplicate once - the lists contain many repeats
+        self.keywords = tuple(sorted({kw.strip().lower() for kw in keywords if kw and kw.strip()}))
+        self._pattern = re.compile(self._build_pattern(self.keywords)) if self.keywords else None
+    
+    @staticmethod
+    def _build_pattern(keywords) -> str:
+        """Build a regex from a character trie so shared prefixes are scanned only once"""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}  # end-of-keyword marker
         
-        # Create signature string: just sorted key-value pairs (no API path)
-        sign_string = ''
-        for key, value in sorted_params:
-            sign_string += str(key) + str(value)
+        def walk(node: Dict) -> str:
+            branches = [re.escape(char) + walk(child) for char, child in node.items() if char]
+            if not branches:
+                return ''
+            pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                # A keyword ends here - the longer continuations are optional
+                pattern = '(?:' + pattern + ')?'
+            return pattern
         
-        # Generate HMAC-SHA256 signature
-        signature = hmac.new(
-            self.app_secret.encode('utf-8'),
-            sign_string.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest().upper()
+        return walk(trie)
+    
+    def __bool__(self) -> bool:
+        return self._pattern is not None
+    
+    def find(self, text: str) -> Optional[str]:
+        """Return the keyword found in the (lowercase) text, or None"""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text)
+        return match.group(0) if match else None
+
+@lru_cache(maxsize=64)
+def _compile_keyword_matcher(keywords: tuple) -> KeywordMatcher:
+    return KeywordMatcher(list(keywords))
+
+def get_keyword_matcher(keywords: List[str]) -> KeywordMatcher:
+    """Return the compiled matcher for a keyword list (rebuilt only when the list changes)"""
+    return _compile_keyword_matcher(tuple(keywords))
+
+class KeywordIndex:
+    """One scan of a title finds every keyword of a vocabulary it contains"""
+    
+    def __init__(self, keywords: List[str]):
+        self.keywords = KeywordMatcher(keywords).keywords
+        # Zero-width lookahead: the longest keyword starting at every position, overlaps included
+        self._pattern = re.compile('(?=(' + KeywordMatcher._build_pattern(self.keywords) + '))') if self.keywords else None
+        self._closure: Dict[str, frozenset] = {}
+    
+    def _substrings(self, keyword: str) -> frozenset:
+        """Keywords contained in a matched keyword ('phone case' also means 'phone' and 'case')"""
+        found = self._closure.get(keyword)
+        if found is None:
+            found = self._closure[keyword] = frozenset(other for other in self.keywords if other in keyword)
+        return found
+    
+    def find_all(self, text: str) -> frozenset:
+        """All keywords contained in the (lowercase) text"""
+        if self._pattern is None:
+            return frozenset()
+        found = set()
+        for match in self._pattern.finditer(text):
+            found |= self._substrings(match.group(1))
+        return frozenset(found)
+
+def channel_filter_signature(channel_config: Dict) -> int:
+    """Hash of the settings that decide which products a channel accepts"""
+    return hash((
+        channel_config.get('min_price', 0), channel_config.get('max_price', 10000),
+        channel_config.get('min_commission', 0), channel_config.get('min_discount', 0),
+        channel_config.get('min_rating', 0), channel_config.get('min_volume', 0),
+        tuple(channel_config.get('keywords', [])), tuple(channel_config.get('exclude_keywords', []))
+    ))
+
+def _parse_number(value) -> float:
+    """Parse API numbers such as '12.5', '7%' or 120"""
+    text = str(value).replace('%', '').strip() if value is not None else ''
+    return float(text) if text else 0.0
+
+def _product_fields(product: Dict) -> Optional[Dict]:
+    """Parse the product fields used by the filters once (None if the numbers are invalid)"""
+    try:
+        price = _parse_number(product.get('target_sale_price', 0))
+        original_price = _parse_number(product.get('target_original_price', price))
+        return {
+            'product_id': product.get('product_id'),
+            'link': bool(product.get('promotion_link')),
+            'title': product.get('product_title', '').lower(),
+            'price': price,
+            'original_price': original_price,
+            'discount': (original_price - price) / original_price * 100 if original_price > 0 else 0.0,
+            'commission': _parse_number(product.get('commission_rate', '0')),
+            'rating': _parse_number(product.get('evaluate_rate', '0')),
+            'volume': _parse_number(product.get('lastest_volume', 0)),
+        }
+    except (TypeError, ValueError):
+        return None
+
+class FilterRule:
+    """One compiled product predicate with its evaluation statistics"""
+    
+    __slots__ = ('reason', 'cost', 'check', 'evaluated', 'rejected')
+    
+    def __init__(self, reason: str, cost: float, check):
+        self.reason = reason
+        self.cost = cost
+        self.check = check
+        self.evaluated = 0
+        self.rejected = 0
+    
+    def rank(self) -> float:
+        """Cheap and selective rules first: cost per expected rejection"""
+        reject_rate = (self.rejected + 1) / (self.evaluated + 2)
+        return self.cost / reject_rate
+
+class FilterPipeline:
+    """Ordered predicate pipeline compiled once from a channel's declarative filter settings"""
+    
+    def __init__(self, channel_config: Dict):
+        rules = [
+            FilterRule('no_link', 1, lambda f: f['link']),
+            FilterRule('no_discount', 1, lambda f: f['original_price'] > f['price']),
+            FilterRule('duplicate', 2, lambda f: f['product_id'] not in POSTED_PRODUCTS),
+        ]
+        
+        # Numeric thresholds - a rule is only compiled when the setting is active
+        min_price = channel_config.get('min_price', 0)
+        max_price = channel_config.get('max_price', 10000)
+        min_commission = channel_config.get('min_commission', 0)
+        min_discount = channel_config.get('min_discount', 0)
+        min_rating = channel_config.get('min_rating', 0)
+        min_volume = channel_config.get('min_volume', 0)
+        if min_price > 0:
+            rules.append(FilterRule('min_price', 1, lambda f: f['price'] >= min_price))
+        if max_price < 10000:
+            rules.append(FilterRule('max_price', 1, lambda f: f['price'] <= max_price))
+        if min_commission > 0:
+            rules.append(FilterRule('min_commission', 1, lambda f: f['commission'] >= min_commission))
+        if min_discount > 0:
+            rules.append(FilterRule('min_discount', 1, lambda f: f['discount'] >= min_discount))
+        if min_rating > 0:
+            rules.append(FilterRule('min_rating', 1, lambda f: f['rating'] >= min_rating))
+        if min_volume > 0:
+            rules.append(FilterRule('min_volume', 1, lambda f: f['volume'] >= min_volume))
+        
+        # Keyword scans are the most expensive checks - when the router already scanned the title
+        # (fields['keyword_hits']), they become set lookups
+        exclude_matcher = get_keyword_matcher(channel_config.get('exclude_keywords', []))
+        include_matcher = get_keyword_matcher(channel_config.get('keywords', []))
+        if exclude_matcher:
+            exclude_set = frozenset(exclude_matcher.keywords)
+            rules.append(FilterRule('exclude_keywords', 10, lambda f: exclude_set.isdisjoint(f['keyword_hits'])
+                                    if 'keyword_hits' in f else exclude_matcher.find(f['title']) is None))
+        if include_matcher:
+            include_set = frozenset(include_matcher.keywords)
+            rules.append(FilterRule('keywords', 20, lambda f: not include_set.isdisjoint(f['keyword_hits'])
+                                    if 'keyword_hits' in f else include_matcher.find(f['title']) is not None))
         
-        return signature
+        self.rules = sorted(rules, key=FilterRule.rank)
     
-    def get_hot_products(self, page_size: int = 50, channel_config: Dict = None, category_ids: Optional[str] = None, retry_without_keywords: bool = True) -> List[Dict]:
-        """Fetch hot products from AliExpress with channel-specific filtering"""
-        logger.info("Fetching hot products from AliExpress...")
+    def accepts(self, fields: Dict, stats: Counter) -> bool:
+        """Check one parsed product - a rejection is counted per reason in stats"""
+        for rule in self.rules:
+            rule.evaluated += 1
+            if not rule.check(fields):
+                rule.rejected += 1
+                stats[rule.reason] += 1
+                return False
+        return True
+    
+    def reorder(self):
+        """Keep the observed most selective cheap rules in front"""
+        self.rules = sorted(self.rules, key=FilterRule.rank)
+    
+    def filter(self, products: List[Dict], stats: Counter) -> List[Dict]:
+        """Products passing every rule - rejections are counted per reason in stats"""
+        accepted = []
+        rules = self.rules
+        for product in products:
+            fields = _product_fields(product)
+            if fields is None:
+                stats['invalid'] += 1
+                continue
+            for rule in rules:
+                rule.evaluated += 1
+                if not rule.check(fields):
+                    rule.rejected += 1
+                    stats[rule.reason] += 1
+                    break
+            else:
+                accepted.append(product)
         
-        # Check if bot is active
-        if not BOT_SETTINGS['active']:
-            logger.info("Bot is paused by admin")
-            return []
+        stats['seen'] += len(products)
+        stats['accepted'] += len(accepted)
+        self.reorder()
+        return accepted
+
+_FILTER_PIPELINES: Dict[int, FilterPipeline] = {}
+
+def get_filter_pipeline(channel_config: Dict) -> FilterPipeline:
+    """Compiled pipeline for a channel config (recompiled only when its filter settings change)"""
+    signature = channel_filter_signature(channel_config)
+    pipeline = _FILTER_PIPELINES.get(signature)
+    if pipeline is None:
+        if len(_FILTER_PIPELINES) >= 64:
+            _FILTER_PIPELINES.clear()
+        pipeline = _FILTER_PIPELINES[signature] = FilterPipeline(channel_config)
+    return pipeline
+
+# Filter counters per channel: seen, accepted and rejections by reason
+FILTER_STATS: Dict[str, Counter] = defaultdict(Counter)
+
+class ChannelRouter:
+    """Classifies a shared product pool against every channel's filters in one pass"""
+    
+    def __init__(self, channels: Dict[str, Dict]):
+        self.pipelines = {key: get_filter_pipeline(config) for key, config in channels.items()}
+        vocabulary = [kw for config in channels.values() for kw in (*config.get('keywords', ()), *config.get('exclude_keywords', ()))]
+        self.index = KeywordIndex(vocabulary)
         
-        # Use default config if none provided
-        if channel_config is None:
-            channel_config = CHANNELS_CONFIG.get('hot_deals', list(CHANNELS_CONFIG.values())[0])
+        # Inverted index: keyword -> channels that want it; channels without keywords take any title
+        self.keyword_channels: Dict[str, set] = defaultdict(set)
+        self.open_channels = set()
+        for key, config in channels.items():
+            keywords = KeywordMatcher(config.get('keywords', [])).keywords
+            if not keywords:
+                self.open_channels.add(key)
+            for keyword in keywords:
+                self.keyword_channels[keyword].add(key)
+    
+    def route(self, products: List[Dict]) -> Dict[str, List[Dict]]:
+        """Accepted products per channel - each title is scanned once for all channels"""
+        routed = {key: [] for key in self.pipelines}
+        candidates_seen = Counter()
+        valid = 0
+        for product in products:
+            fields = _product_fields(product)
+            if fields is None:
+                continue
+            valid += 1
+            fields['keyword_hits'] = hits = self.index.find_all(fields['title'])
+            channels = set(self.open_channels)
+            for keyword in hits:
+                channels |= self.keyword_channels.get(keyword, set())
+            for key in channels:
+                candidates_seen[key] += 1
+                if self.pipelines[key].accepts(fields, FILTER_STATS[key]):
+                    routed[key].append(product)
         
-        # Build parameters
-        params = {
-            'app_key': self.app_key,
-            'format': 'json',
-            'method': 'aliexpress.affiliate.product.query',
-            'sign_method': 'sha256',
-            'timestamp': str(int(time.time() * 1000)),
-            'v': '2.0',
+        for key, pipeline in self.pipelines.items():
+            stats = FILTER_STATS[key]
+            stats['seen'] += len(products)
+            stats['invalid'] += len(products) - valid
+            stats['keywords'] += valid - candidates_seen[key]  # no keyword of the channel in the title
+            stats['accepted'] += len(routed[key])
+            pipeline.reorder()
+        return routed
+
+_CHANNEL_ROUTER: Dict[tuple, ChannelRouter] = {}
+
+def get_channel_router(channels: Dict[str, Dict]) -> ChannelRouter:
+    """Router for a set of channels (rebuilt only when a channel or its filters change)"""
+    signature = tuple((key, channel_filter_signature(config)) for key, config in channels.items())
+    router = _CHANNEL_ROUTER.get(signature)
+    if router is None:
+        _CHANNEL_ROUTER.clear()
+        router = _CHANNEL_ROUTER[signature] = ChannelRouter(channels)
+    return router
+
+@METRICS.collector
+def collect_filter_stats():
+    """Export FILTER_STATS: products fetched / accepted per channel and rejections by reason"""
+    channels = list(FILTER_STATS.items())
+    yield ('products_fetched_total', 'counter', 'Products returned by AliExpress per channel', ('channel',),
+           [((key, ), stats['seen']) for key, stats in channels])
+    yield ('products_accepted_total', 'counter', 'Products that passed the channel filters', ('channel',),
+           [((key, ), stats['accepted']) for key, stats in channels])
+    yield ('filter_rejections_total', 'counter', 'Products rejected by the channel filters', ('channel', 'reason'),
+           [((key, reason), count) for key, stats in channels for reason, count in stats.items()
+            if reason not in ('seen', 'accepted')])
+
+# Rejection reasons as shown on the admin panel
+FILTER_REASON_LABELS = {
+    'invalid': 'بيانات غير صالحة',
+    'no_link': 'بدون رابط',
+    'no_discount': 'بدون خصم',
+    'duplicate': 'منشور سابقاً',
+    'min_price': 'سعر منخفض',
+    'max_price': 'سعر مرتفع',
+    'min_commission': 'عمولة منخفضة',
+    'min_discount': 'خصم منخفض',
+    'min_rating': 'تقييم منخفض',
+    'min_volume': 'مبيعات قليلة',
+    'exclude_keywords': 'كلمة مستبعدة',
+    'keywords': 'بدون كلمة مفتاحية',
+}
+
+# Product ranking defaults - a channel may override them with score_weights / score_noise
+SCORE_WEIGHTS = {'discount': 0.35, 'commission': 0.15, 'rating': 0.2, 'volume': 0.2, 'freshness': 0.1}
+SCORE_NOISE = 0.1  # random share added to every score (0 = always the same top products)
+
+# Channel definition schema: field -> (type, default); fields without a default are required
+CHANNEL_FIELDS = {
+    'channel_id': (str, None),
+    'name': (str, None),
+    'active': (bool, True),
+    'posting_interval': (int, None),  # minutes
+    'min_price': (float, 0),
+    'max_price': (float, 10000),
+    'min_commission': (float, 0),
+    'min_discount': (float, 0),
+    'min_rating': (float, 0),
+    'min_volume': (float, 0),
+    'keywords': (list, []),
+    'exclude_keywords': (list, []),
+    'score_weights': (dict, {}),  # signal -> weight, merged over SCORE_WEIGHTS
+    'score_noise': (float, SCORE_NOISE),
+}
+CHANNEL_KEY_PATTERN = re.compile(r'^[a-z0-9_]{1,32}$')  # keys end up in callback data
+
+class ChannelConfigError(ValueError):
+    """Invalid channel definitions"""
+
+def validate_channel(channel_key: str, raw: Dict) -> MappingProxyType:
+    """Check one channel definition and return it as a read-only mapping (lists become tuples)"""
+    if not CHANNEL_KEY_PATTERN.match(str(channel_key)):
+        raise ChannelConfigError(f"{channel_key}: invalid channel key")
+    if not isinstance(raw, dict):
+        raise ChannelConfigError(f"{channel_key}: expected an object")
+    unknown = set(raw) - set(CHANNEL_FIELDS)
+    if unknown:
+        raise ChannelConfigError(f"{channel_key}: unknown fields {', '.join(sorted(unknown))}")
+    
+    config = {}
+    for field, (kind, default) in CHANNEL_FIELDS.items():
+        value = raw.get(field, default)
+        if value is None:
+            raise ChannelConfigError(f"{channel_key}: missing {field}")
+        if kind is list:
+            if not isinstance(value, (list, tuple)) or not all(isinstance(kw, str) for kw in value):
+                raise ChannelConfigError(f"{channel_key}: {field} must be a list of strings")
+            value = tuple(value)
+        elif kind is dict:
+            if not isinstance(value, (dict, MappingProxyType)) or not set(value) <= set(SCORE_WEIGHTS) or not all(
+                    isinstance(weight, (int, float)) and not isinstance(weight, bool) and weight >= 0 for weight in value.values()):
+                raise ChannelConfigError(f"{channel_key}: {field} must map {', '.join(SCORE_WEIGHTS)} to numbers >= 0")
+            value = MappingProxyType(dict(value))
+        elif kind is float:
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ChannelConfigError(f"{channel_key}: {field} must be a number >= 0")
+        elif kind is int:
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ChannelConfigError(f"{channel_key}: {field} must be a whole number >= 1")
+        elif not isinstance(value, kind) or (kind is str and not value.strip()):
+            raise ChannelConfigError(f"{channel_key}: {field} must be a non-empty {kind.__name__}")
+        config[field] = value
+    
+    if config['min_price'] > config['max_price']:
+        raise ChannelConfigError(f"{channel_key}: min_price is above max_price")
+    return MappingProxyType(config)
+
+def channel_price_params(channel_config: Dict) -> Dict[str, str]:
+    """Price bounds of the product query for a channel"""
+    params = {}
+    # Note: AliExpress API doesn't support decimal min_price, so only add if >= 1
+    min_price = channel_config.get('min_price', 0)
+    if min_price >= 1:
+        params['min_sale_price'] = str(int(min_price))
+    if channel_config.get('max_price', 10000) < 10000:
+        params['max_sale_price'] = str(int(channel_config['max_price']))
+    return params
+
+class ChannelSnapshot:
+    """Immutable set of validated channel definitions with everything derived from them built once"""
+    
+    def __init__(self, channels: Dict[str, Dict]):
+        if not isinstance(channels, dict) or not channels:
+            raise ChannelConfigError("expected a non-empty object of channels")
+        self.channels = MappingProxyType({key: validate_channel(key, raw) for key, raw in channels.items()})
+        # Compiled filters and query templates - cycles never rebuild them per product or per query
+        self.pipelines = {key: get_filter_pipeline(config) for key, config in self.channels.items()}
+        self.price_params = {key: MappingProxyType(channel_price_params(config)) for key, config in self.channels.items()}
+        active = {key: config for key, config in self.channels.items() if config['active']}
+        if active:
+            get_channel_router(active)
+    
+    def replace(self, channel_key: str, **changes) -> 'ChannelSnapshot':
+        """New snapshot with some fields of one channel changed"""
+        channels = {key: dict(config) for key, config in self.channels.items()}
+        channels[channel_key].update(changes)
+        return ChannelSnapshot(channels)
+    
+    def to_json(self) -> str:
+        def plain(value):
+            if isinstance(value, tuple):
+                return list(value)
+            return dict(value) if isinstance(value, MappingProxyType) else value
+        
+        channels = {key: {field: plain(value) for field, value in config.items()} for key, config in self.channels.items()}
+        return json.dumps(channels, ensure_ascii=False, indent=2) + '\n'
+
+class ChannelStore:
+    """Holds the current channel snapshot - swapped atomically on admin edits and channels file changes"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.snapshot: Optional[ChannelSnapshot] = None
+        self._file_state = None  # (mtime_ns, size) of the channels file last loaded or written
+    
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load(self) -> ChannelSnapshot:
+        """Read and validate the channels file and make it current"""
+        file_state = self._stat()
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                channels = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ChannelConfigError(f"cannot read {self.path}: {e}") from e
+        snapshot = ChannelSnapshot(channels)
+        self._file_state = file_state
+        self.install(snapshot)
+        return snapshot
+    
+    def install(self, snapshot: ChannelSnapshot):
+        """Make a snapshot current - cycles already running keep the one they started with"""
+        global CHANNELS_CONFIG
+        replacing = self.snapshot is not None
+        self.snapshot = snapshot
+        CHANNELS_CONFIG = snapshot.channels
+        if replacing:
+            bump_panel_state()  # admin screens show channel settings
+    
+    def save(self, snapshot: ChannelSnapshot):
+        """Write a snapshot to the channels file (atomically - a crash never leaves half a file)"""
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot.to_json())
+        os.replace(temp_path, self.path)
+        self._file_state = self._stat()
+    
+    def update(self, channel_key: str, **changes) -> ChannelSnapshot:
+        """Apply an admin edit: validate, persist and swap in the new snapshot"""
+        snapshot = self.snapshot.replace(channel_key, **changes)
+        try:
+            self.save(snapshot)
+        except OSError as e:
+            logger.error("Could not save channel settings to %s: %s", self.path, e)
+        self.install(snapshot)
+        return snapshot
+    
+    def reload_if_changed(self) -> Optional[ChannelSnapshot]:
+        """Load the channels file if it changed on disk - returns the previous snapshot when it did"""
+        file_state = self._stat()
+        if file_state is None or file_state == self._file_state:
+            return None
+        previous = self.snapshot
+        try:
+            self.load()
+        except ChannelConfigError as e:
+            self._file_state = file_state  # report a broken file once, not on every check
+            logger.error("Channels file not reloaded, keeping the current settings: %s", e)
+            return None
+        logger.info("Reloaded %d channels from %s", len(self.snapshot.channels), self.path)
+        return previous
+
+def channel_owner(channel_key: str) -> int:
+    """Worker that posts a channel - rendezvous hashing, so few channels move when WORKER_COUNT changes"""
+    return max(range(WORKER_COUNT),
+               key=lambda worker: hashlib.blake2b(f'{worker}:{channel_key}'.encode('utf-8'), digest_size=8).digest())
+
+def owns_channel(channel_key: str) -> bool:
+    """Whether this worker schedules and prefetches a channel (WORKER_CHANNELS overrides hashing)"""
+    if WORKER_CHANNELS:
+        return channel_key in WORKER_CHANNELS
+    return channel_owner(channel_key) == WORKER_ID
+
+# Channel definitions - CHANNELS_CONFIG always points at the current read-only snapshot
+CHANNEL_STORE = ChannelStore(CHANNELS_CONFIG_PATH)
+CHANNELS_CONFIG = CHANNEL_STORE.load().channels
+
+# Adaptive keyword selection - keywords that bring postable products are queried more often
+KEYWORD_PRIOR_YIELD = 5.0  # accepted products per query assumed for an untried keyword
+KEYWORD_PRIOR_QUERIES = 2.0  # weight of the prior, in queries
+KEYWORD_POSTED_WEIGHT = 3.0  # a posted product counts this much more than an accepted one
+KEYWORD_EXPLORATION = 0.2  # share of the selection probability spread evenly over all keywords
+KEYWORD_STATS_WINDOW = 50  # queries after which a keyword's counts are halved (recent yield matters most)
+KEYWORD_ORIGINS_SIZE = 5000  # remembered product -> keyword attributions
+
+class KeywordStats:
+    """Per-channel keyword yield (queries, accepted and posted products) with weighted selection, persisted to SQLite"""
+    
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        self._conn = open_state_db(db_path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS keyword_stats (channel_key TEXT NOT NULL, keyword TEXT NOT NULL, '
+            'queries REAL NOT NULL, accepted REAL NOT NULL, posted REAL NOT NULL, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (channel_key, keyword))'
+        )
+        self._conn.commit()
+        self._stats: Dict[tuple, List[float]] = {
+            (channel_key, keyword): [queries, accepted, posted]
+            for channel_key, keyword, queries, accepted, posted in self._conn.execute(
+                'SELECT channel_key, keyword, queries, accepted, posted FROM keyword_stats')
+        }
+        self._origins: 'OrderedDict[tuple, str]' = OrderedDict()  # (channel_key, product_id) -> keyword
+    
+    def score(self, channel_key: str, keyword: str) -> float:
+        """Smoothed yield per query - untried keywords start at the prior, so they get tried"""
+        queries, accepted, posted = self._stats.get((channel_key, keyword), (0.0, 0.0, 0.0))
+        return ((accepted + KEYWORD_POSTED_WEIGHT * posted + KEYWORD_PRIOR_YIELD * KEYWORD_PRIOR_QUERIES)
+                / (queries + KEYWORD_PRIOR_QUERIES))
+    
+    def select(self, channel_key: str, keywords: List[str], count: int) -> List[str]:
+        """Weighted sample of `count` distinct keywords, favouring high yield while still exploring"""
+        candidates = list(dict.fromkeys(kw.strip().lower() for kw in keywords if kw and kw.strip()))
+        count = min(count, len(candidates))
+        scores = [self.score(channel_key, keyword) for keyword in candidates]
+        total = sum(scores)
+        weights = [(1 - KEYWORD_EXPLORATION) * score / total + KEYWORD_EXPLORATION / len(candidates) for score in scores]
+        # Weighted sampling without replacement (Efraimidis-Spirakis): largest random() ** (1 / weight) wins
+        ranked = heapq.nlargest(count, zip(weights, candidates), key=lambda item: random.random() ** (1 / item[0]))
+        return [keyword for _, keyword in ranked]
+    
+    def record_query(self, channel_key: str, keywords: List[str], accepted_products: List[Dict]):
+        """Credit a keyword query with the products it brought through the filters"""
+        if not keywords:
+            return
+        credit = dict.fromkeys(keywords, 0.0)
+        matcher = get_keyword_matcher(keywords)
+        for product in accepted_products:
+            keyword = matcher.find(str(product.get('product_title', '')).lower())
+            if keyword in credit:
+                credit[keyword] += 1
+                self._remember_origin(channel_key, product, keyword)
+            else:
+                # Matched on something other than the title - share the credit
+                for other in credit:
+                    credit[other] += 1 / len(credit)
+        
+        now = time.time()
+        rows = []
+        for keyword, accepted in credit.items():
+            stats = self._stats.setdefault((channel_key, keyword), [0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += accepted
+            if stats[0] > KEYWORD_STATS_WINDOW:
+                stats[:] = [value / 2 for value in stats]
+            rows.append((channel_key, keyword, *stats, now))
+        self._save(rows)
+    
+    def _remember_origin(self, channel_key: str, product: Dict, keyword: str):
+        key = (channel_key, str(product.get('product_id')))
+        self._origins[key] = keyword
+        self._origins.move_to_end(key)
+        while len(self._origins) > KEYWORD_ORIGINS_SIZE:
+            self._origins.popitem(last=False)
+    
+    def record_posted(self, channel_key: str, product: Dict):
+        """Credit the keyword that found a product once it is posted"""
+        keyword = self._origins.pop((channel_key, str(product.get('product_id'))), None)
+        if keyword is None:
+            return
+        stats = self._stats.setdefault((channel_key, keyword), [0.0, 0.0, 0.0])
+        stats[2] += 1
+        self._save([(channel_key, keyword, *stats, time.time())])
+    
+    def _save(self, rows: List[tuple]):
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO keyword_stats (channel_key, keyword, queries, accepted, posted, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.error("Error saving keyword stats: %s", e)
+    
+    def top(self, channel_key: str, count: int = 5) -> List[tuple]:
+        """Best keywords of a channel as (keyword, score, queries, posted)"""
+        rows = [(keyword, self.score(channel_key, keyword), stats[0], stats[2])
+                for (key, keyword), stats in self._stats.items() if key == channel_key and stats[0]]
+        return heapq.nlargest(count, rows, key=lambda row: row[1])
+    
+    def close(self):
+        self._conn.close()
+
+KEYWORD_STATS = KeywordStats()
+
+class AliExpressAPIError(Exception):
+    """AliExpress returned an error response or could not be reached"""
+    
+    def __init__(self, message: str, code: Optional[str] = None, transient: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.transient = transient  # worth retrying (network, 5xx, throttling, service unavailable)
+
+class MemoryCacheBackend:
+    """In-memory LRU storage for cached API responses"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires_at, value)
+    
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def set(self, key: str, value, ttl: int):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """On-disk storage for cached API responses (survives restarts)"""
+    
+    def __init__(self, max_entries: int, db_path: str):
+        self.max_entries = max_entries
+        self._conn = open_state_db(db_path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS api_cache (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)'
+        )
+        self._conn.execute('DELETE FROM api_cache WHERE expires_at < ?', (time.time(),))
+        self._conn.commit()
+    
+    def get(self, key: str):
+        row = self._conn.execute('SELECT expires_at, value FROM api_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return json.loads(row[1])
+    
+    def set(self, key: str, value, ttl: int):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO api_cache (key, expires_at, value) VALUES (?, ?, ?)',
+                               (key, time.time() + ttl, json.dumps(value)))
+            # Size bound - drop the entries closest to expiry
+            self._conn.execute(
+                'DELETE FROM api_cache WHERE key NOT IN (SELECT key FROM api_cache ORDER BY expires_at DESC LIMIT ?)',
+                (self.max_entries,)
+            )
+    
+    def clear(self):
+        with self._conn:
+            self._conn.execute('DELETE FROM api_cache')
+    
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM api_cache').fetchone()[0]
+
+class ResponseCache:
+    """TTL response cache for AliExpress queries with in-flight request coalescing"""
+    
+    def __init__(self, ttl: int, max_entries: int, backend: str = 'memory', db_path: str = STATE_DB_PATH):
+        self.ttl = ttl
+        if backend == 'sqlite':
+            self._backend = SQLiteCacheBackend(max_entries, db_path)
+        else:
+            self._backend = MemoryCacheBackend(max_entries)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+    
+    @staticmethod
+    def make_key(api_params: Dict[str, str]) -> str:
+        """Normalized cache key - timestamp and sign are never part of api_params"""
+        normalized = {key: str(value).strip() for key, value in api_params.items()}
+        if 'keywords' in normalized:
+            normalized['keywords'] = ','.join(sorted(kw.strip().lower() for kw in normalized['keywords'].split(',')))
+        return json.dumps(normalized, sort_keys=True)
+    
+    async def get_or_fetch(self, key: str, fetch):
+        """Return the cached value or run fetch() once for all concurrent callers"""
+        if self.ttl > 0:
+            value = self._backend.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        
+        # Only successful results are cached - errors raise, unsuccessful results are None
+        if value is not None and self.ttl > 0:
+            self._backend.set(key, value, self.ttl)
+        return value
+    
+    def clear(self):
+        self._backend.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._backend),
         }
+
+# AliExpress response cache - identical queries within the TTL share one API call
+API_RESPONSE_CACHE = ResponseCache(
+    ttl=int(os.getenv('API_CACHE_TTL', '600')),
+    max_entries=int(os.getenv('API_CACHE_SIZE', '256')),
+    backend=os.getenv('API_CACHE_BACKEND', 'memory')
+)
+
+@METRICS.collector
+def collect_cache_stats():
+    """Export the AliExpress response cache counters"""
+    stats = API_RESPONSE_CACHE.stats()
+    yield ('aliexpress_cache_lookups_total', 'counter', 'AliExpress product queries by cache result', ('result',),
+           [(('hit',), stats['hits']), (('coalesced',), stats['coalesced']), (('miss',), stats['misses'])])
+    yield ('aliexpress_cache_entries', 'gauge', 'Cached AliExpress query results', (), [((), stats['entries'])])
+
+class CircuitBreaker:
+    """Fails fast after repeated failures of an endpoint and lets a single probe through after a cool-down"""
+    
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+    
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False  # one probe at a time
+            self._probing = True
+        return self.state != self.OPEN
+    
+    def retry_in(self) -> float:
+        """Seconds until the next probe (0 unless open)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+    
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit %s closed again", self.name)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self.trips += 1
+            self._opened_at = time.monotonic()
+            self._probing = False
+            logger.warning("Circuit %s opened after %d failures, probing again in %ss", self.name, self.failures, self.reset_timeout)
+
+# Circuit breakers by endpoint
+CIRCUIT_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+def circuit_breaker(name: str) -> CircuitBreaker:
+    """Breaker of an endpoint, created on first use"""
+    breaker = CIRCUIT_BREAKERS.get(name)
+    if breaker is None:
+        breaker = CIRCUIT_BREAKERS[name] = CircuitBreaker(name)
+    return breaker
+
+@METRICS.collector
+def collect_breaker_states():
+    """Export the circuit breaker states (0 closed, 1 half open, 2 open) and trips"""
+    breakers = list(CIRCUIT_BREAKERS.values())
+    levels = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    yield ('circuit_breaker_state', 'gauge', 'Circuit breaker state (0 closed, 1 half open, 2 open)', ('endpoint',),
+           [((breaker.name,), levels[breaker.state]) for breaker in breakers])
+    yield ('circuit_breaker_trips_total', 'counter', 'Times a circuit breaker opened', ('endpoint',),
+           [((breaker.name,), breaker.trips) for breaker in breakers])
+
+def breaker_summary() -> str:
+    """Circuit breaker lines for the stats screen"""
+    labels = {CircuitBreaker.CLOSED: "🟢 متصل", CircuitBreaker.HALF_OPEN: "🟡 اختبار الاتصال"}
+    lines = []
+    for breaker in CIRCUIT_BREAKERS.values():
+        state = labels.get(breaker.state) or f"🔴 متوقف مؤقتاً (محاولة بعد {breaker.retry_in():.0f}ث)"
+        lines.append(f"• {breaker.name}: {state} - انقطع {breaker.trips} مرة")
+    return '\n'.join(lines) or "• لا توجد طلبات بعد"
+
+class AliExpressAPI:
+    """Async handler for AliExpress Affiliates API (pooled httpx client)"""
+    
+    def __init__(self, app_key: str, app_secret: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.api_url = ALIEXPRESS_API_URL
+        # Keyed HMAC state is built once and copied for every signature
+        self._sign_hmac = hmac.new(self.app_secret.encode('utf-8'), digestmod=hashlib.sha256)
+        self._transport = transport  # custom transport (recorded responses in benchmarks)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = circuit_breaker('aliexpress.affiliate.product.query')
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared keep-alive client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(ALIEXPRESS_READ_TIMEOUT, connect=ALIEXPRESS_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=ALIEXPRESS_MAX_CONNECTIONS,
+                    max_keepalive_connections=ALIEXPRESS_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=ALIEXPRESS_KEEPALIVE_EXPIRY
+                ),
+                transport=self._transport
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the pooled HTTP client"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    def _generate_sign(self, params: Dict[str, str]) -> str:
+        """Generate signature for AliExpress API request"""
+        # Create signature string: sorted key-value pairs (no API path)
+        sign_string = ''.join(str(key) + str(value) for key, value in sorted(params.items()))
         
-        # Add API specific parameters
+        # Generate HMAC-SHA256 signature from the pre-keyed state
+        signature = self._sign_hmac.copy()
+        signature.update(sign_string.encode('utf-8'))
+        return signature.hexdigest().upper()
+    
+    def _build_query_params(self, page_size: int, channel_config: Dict, category_ids: Optional[str] = None, page_no: int = 1,
+                            channel_key: Optional[str] = None) -> Dict[str, str]:
+        """Build the API specific (unsigned) query parameters for a channel"""
         api_params = {
-            'page_no': '1',
+            'page_no': str(page_no),
             'page_size': str(page_size),
             'target_currency': 'USD',
             'target_language': 'EN',
@@ -512,139 +1418,196 @@ class AliExpressAPI:
         if category_ids:
             api_params['category_ids'] = category_ids
             
-        # Add price range from channel config
-        # Note: AliExpress API doesn't support decimal min_price, so only add if >= 1
-        min_price = channel_config.get('min_price', 0)
-        if min_price >= 1:
-            api_params['min_sale_price'] = str(int(min_price))
+        # Add price range from channel config - prebuilt for the channels of the current snapshot
+        snapshot = CHANNEL_STORE.snapshot
+        if channel_key and snapshot.channels.get(channel_key) is channel_config:
+            api_params.update(snapshot.price_params[channel_key])
+        else:
+            api_params.update(channel_price_params(channel_config))
         
-        # Max price is always sent
-        if channel_config.get('max_price', 10000) < 10000:
-            api_params['max_sale_price'] = str(int(channel_config['max_price']))
-            
         # Add keywords from channel config with rotation
         keywords = channel_config.get('keywords', [])
         if keywords:
-            # Randomly select 3-5 keywords for variety (instead of always first 3)
-            import random
             num_keywords = min(random.randint(3, 5), len(keywords))
-            selected_keywords = random.sample(keywords, num_keywords)
+            if channel_key:
+                # Favour keywords that brought postable products before
+                selected_keywords = KEYWORD_STATS.select(channel_key, keywords, num_keywords)
+            else:
+                # Randomly select 3-5 keywords for variety (instead of always first 3)
+                selected_keywords = random.sample(keywords, num_keywords)
             api_params['keywords'] = ','.join(selected_keywords)
-            logger.info(f"Using keywords: {', '.join(selected_keywords)}")
+            logger.debug("Using keywords: %s", api_params['keywords'])
         
-        # Merge all parameters for signature
-        all_params = {**params, **api_params}
-        
-        # Generate signature
-        sign = self._generate_sign(all_params)
-        params['sign'] = sign
+        return api_params
+    
+    async def _request_products(self, api_params: Dict[str, str]) -> Optional[List[Dict]]:
+        """Product query with retries on transient failures - fails fast while the circuit is open"""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                ALIEXPRESS_ERRORS.inc('circuit_open')
+                raise AliExpressAPIError(f"AliExpress unavailable, next try in {self.breaker.retry_in():.0f}s", code='circuit_open')
+            try:
+                products = await self._hedged_request(api_params)
+            except AliExpressAPIError as e:
+                if not e.transient:
+                    self.breaker.record_success()  # the endpoint answered - the request itself is wrong
+                    raise
+                self.breaker.record_failure()
+                if attempt >= ALIEXPRESS_RETRIES or self.breaker.state == CircuitBreaker.OPEN:
+                    raise
+                attempt += 1
+                backoff = random.uniform(0, min(ALIEXPRESS_RETRY_MAX, ALIEXPRESS_RETRY_BASE * 2 ** (attempt - 1)))
+                ALIEXPRESS_RETRIES_TOTAL.inc(str(e.code))
+                logger.warning("AliExpress request failed (%s), retry %d in %.1fs", e, attempt, backoff)
+                await asyncio.sleep(backoff)
+                continue
+            except BaseException as e:
+                # Nothing may leave a half-open probe slot taken - a cancelled probe counts as failed
+                if self.breaker.state == CircuitBreaker.HALF_OPEN or not isinstance(e, asyncio.CancelledError):
+                    self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return products
+    
+    async def _hedged_request(self, api_params: Dict[str, str]) -> Optional[List[Dict]]:
+        """Send a query and race it with a copy when it is slower than ALIEXPRESS_HEDGE_DELAY - first success wins"""
+        tasks = [asyncio.ensure_future(self._send_query(api_params))]
+        try:
+            if not ALIEXPRESS_HEDGE_DELAY or self.breaker.state != CircuitBreaker.CLOSED:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=ALIEXPRESS_HEDGE_DELAY)
+            if not done:
+                ALIEXPRESS_HEDGES.inc()
+                tasks.append(asyncio.ensure_future(self._send_query(api_params)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()  # the losing copy
+                elif not task.cancelled():
+                    task.exception()  # a failed loser counts as retrieved
+    
+    async def _send_query(self, api_params: Dict[str, str]) -> Optional[List[Dict]]:
+        """Send a signed product query - returns the raw product list, None for an unsuccessful result"""
+        # Build parameters
+        params = {
+            'app_key': self.app_key,
+            'format': 'json',
+            'method': 'aliexpress.affiliate.product.query',
+            'sign_method': 'sha256',
+            'timestamp': str(int(time.time() * 1000)),
+            'v': '2.0',
+        }
         
-        # Add API params to request params
+        # Generate signature over all parameters, then add API params to request params
+        params['sign'] = self._generate_sign({**params, **api_params})
         params.update(api_params)
         
-        logger.info(f"Requesting AliExpress API: /{params['method']}")
+        logger.debug("Requesting AliExpress API: /%s", params['method'])
         
+        started = time.perf_counter()
         try:
-            response = requests.get(self.api_url, params=params, timeout=60)
+            response = await self._get_client().get(self.api_url, params=params)
+            if response.status_code >= 500:
+                ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'http_error')
+                ALIEXPRESS_ERRORS.inc(f'http_{response.status_code}')
+                raise AliExpressAPIError(f"HTTP {response.status_code}", code=f'http_{response.status_code}', transient=True)
             data = response.json()
+            if not isinstance(data, dict):
+                raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+        except httpx.HTTPError as e:
+            ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'network_error')
+            ALIEXPRESS_ERRORS.inc('network')
+            raise AliExpressAPIError(f"Network error: {e!r}", code='network', transient=True) from e
+        except ValueError as e:
+            # Truncated or HTML bodies come from overloaded gateways
+            ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'invalid_body')
+            ALIEXPRESS_ERRORS.inc('invalid_body')
+            raise AliExpressAPIError(f"Invalid response body: {e}", code='invalid_body', transient=True) from e
+        
+        try:
+            products = self._parse_products(data)
+        except (AttributeError, TypeError) as e:
+            # Valid JSON of an unexpected shape (null or non-object members)
+            ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'invalid_body')
+            ALIEXPRESS_ERRORS.inc('invalid_body')
+            raise AliExpressAPIError(f"Unexpected response shape: {e!r}", code='invalid_body', transient=True) from e
+        except AliExpressAPIError:
+            ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'api_error')
+            raise
+        ALIEXPRESS_LATENCY.observe(time.perf_counter() - started, 'ok')
+        return products
+    
+    @staticmethod
+    def _parse_products(data: Dict) -> Optional[List[Dict]]:
+        """Raw product list of a decoded response (None for an unsuccessful result)"""
+        if 'error_response' in data:
+            error = data['error_response']
+            ALIEXPRESS_ERRORS.inc(str(error.get('code')))
+            raise AliExpressAPIError(f"API Error: {error.get('code')} - {error.get('msg')}", code=error.get('code'),
+                                     transient=error.get('code') in ALIEXPRESS_TRANSIENT_CODES)
+        
+        resp_result = data.get('aliexpress_affiliate_product_query_response', {}).get('resp_result')
+        if not resp_result or resp_result.get('resp_code') != 200:
+            return None
+        
+        products_data = resp_result.get('result', {}).get('products', {})
+        if isinstance(products_data, dict):
+            products = products_data.get('product', [])
+        else:
+            products = products_data
+        
+        # Ensure it's a list
+        if not products:
+            return []
+        if not isinstance(products, list):
+            products = [products]
+        return products
+    
+    async def query_products(self, api_params: Dict[str, str]) -> List[Dict]:
+        """Raw product list for a query, served from the response cache when possible"""
+        products = await API_RESPONSE_CACHE.get_or_fetch(
+            ResponseCache.make_key(api_params),
+            lambda: self._request_products(api_params)
+        )
+        return products or []
+    
+    def _filter_products(self, products: List[Dict], channel_config: Dict, channel_key: Optional[str] = None) -> List[Dict]:
+        """Apply the channel filter pipeline to a raw product list"""
+        stats = FILTER_STATS[channel_key or channel_config.get('name', 'default')]
+        return get_filter_pipeline(channel_config).filter(products, stats)
+    
+    async def get_hot_products(self, page_size: int = 50, channel_config: Dict = None, category_ids: Optional[str] = None, retry_without_keywords: bool = True, page_no: int = 1) -> List[Dict]:
+        """Fetch hot products from AliExpress with channel-specific filtering"""
+        logger.debug("Fetching hot products from AliExpress...")
+        
+        # Check if bot is active
+        if not BOT_SETTINGS['active']:
+            logger.info("Bot is paused by admin")
+            return []
+        
+        # Use default config if none provided
+        if channel_config is None:
+            channel_config = CHANNELS_CONFIG.get('hot_deals', list(CHANNELS_CONFIG.values())[0])
+        
+        api_params = self._build_query_params(page_size, channel_config, category_ids, page_no)
+        
+        try:
+            products = await self.query_products(api_params)
+            valid_products = self._filter_products(products, channel_config)
             
-            if 'error_response' in data:
-                error = data['error_response']
-                logger.error(f"API Error: {error.get('code')} - {error.get('msg')}")
-                return []
-            
-            if 'aliexpress_affiliate_product_query_response' in data:
-                resp_result = data['aliexpress_affiliate_product_query_response'].get('resp_result')
-                
-                if resp_result and resp_result.get('resp_code') == 200:
-                    result = resp_result.get('result', {})
-                    products_data = result.get('products', {})
-                    
-                    if products_data:
-                        if isinstance(products_data, dict):
-                            products = products_data.get('product', [])
-                        else:
-                            products = products_data
-                        
-                        if products:
-                            # Ensure it's a list
-                            if not isinstance(products, list):
-                                products = [products]
-                            
-                            # Filter products with smart filtering
-                            valid_products = []
-                            for product in products:
-                                # Check if product has promotion link
-                                if not product.get('promotion_link'):
-                                    continue
-                                
-                                # Get product details
-                                product_id = product.get('product_id')
-                                title = product.get('product_title', '').lower()
-                                price = float(product.get('target_sale_price', 0))
-                                original_price = float(product.get('target_original_price', price))
-                                
-                                # Parse commission rate (remove % sign if present)
-                                commission_str = str(product.get('commission_rate', '0'))
-                                commission_rate = float(commission_str.replace('%', '').strip())
-                                
-                                # 0. Check for real discount - skip products with no discount
-                                if original_price <= price:
-                                    logger.debug(f"Skipping product with no discount: {title[:50]}... (original=${original_price}, sale=${price})")
-                                    continue
-                                
-                                # 1. Check for duplicates
-                                if product_id in POSTED_PRODUCTS:
-                                    logger.debug(f"Skipping duplicate product: {product_id}")
-                                    continue
-                                
-                                # 2. Filter by price range
-                                min_price = channel_config.get('min_price', 0)
-                                max_price = channel_config.get('max_price', 10000)
-                                if min_price > 0 and price < min_price:
-                                    logger.debug(f"Product price ${price} below minimum ${min_price}")
-                                    continue
-                                if max_price < 10000 and price > max_price:
-                                    logger.debug(f"Product price ${price} above maximum ${max_price}")
-                                    continue
-                                
-                                # 3. Filter by commission rate
-                                min_commission = channel_config.get('min_commission', 0)
-                                if commission_rate < min_commission:
-                                    logger.debug(f"Product commission {commission_rate}% below minimum {min_commission}%")
-                                    continue
-                                
-                                # 4. Filter by keywords (include)
-                                keywords = channel_config.get('keywords', [])
-                                if keywords:
-                                    has_keyword = False
-                                    for keyword in keywords:
-                                        if keyword.lower() in title:
-                                            has_keyword = True
-                                            break
-                                    if not has_keyword:
-                                        logger.debug(f"Product doesn't contain required keywords")
-                                        continue
-                                
-                                # 5. Filter by exclude keywords
-                                exclude_keywords = channel_config.get('exclude_keywords', [])
-                                if exclude_keywords:
-                                    has_exclude = False
-                                    for keyword in exclude_keywords:
-                                        if keyword.lower() in title:
-                                            has_exclude = True
-                                            logger.debug(f"Product contains excluded keyword: {keyword}")
-                                            break
-                                    if has_exclude:
-                                        continue
-                                
-                                # Product passed all filters
-                                valid_products.append(product)
-                            
-                            if valid_products:
-                                logger.info(f"Successfully fetched {len(valid_products)} real products with tracking!")
-                                logger.info(f"Filters applied: price(${channel_config.get('min_price', 0)}-${channel_config.get('max_price', 10000)}), commission({channel_config.get('min_commission', 0)}%), keywords({len(channel_config.get('keywords', []))}), exclude({len(channel_config.get('exclude_keywords', []))})")
-                                return valid_products
+            if valid_products:
+                logger.info("Successfully fetched %d real products with tracking!", len(valid_products))
+                return valid_products
             
             # Fallback: If no products found and we have keywords, try again without keywords
             if retry_without_keywords and channel_config.get('keywords'):
@@ -652,48 +1615,699 @@ class AliExpressAPI:
                 # Create a copy without keywords
                 fallback_config = channel_config.copy()
                 fallback_config['keywords'] = []
-                return self.get_hot_products(page_size=page_size, channel_config=fallback_config, 
-                                            category_ids=category_ids, retry_without_keywords=False)
+                return await self.get_hot_products(page_size=page_size, channel_config=fallback_config, 
+                                                  category_ids=category_ids, retry_without_keywords=False,
+                                                  page_no=page_no)
             
             logger.warning("No valid products with tracking found - skipping this cycle")
             return []
             
-        except requests.RequestException as e:
-            logger.error(f"Network error: {e}")
+        except AliExpressAPIError as e:
+            logger.error(str(e))
             logger.info("Skipping this cycle - no real products available")
             return []
         except Exception as e:
-            logger.error(f"Error fetching products: {e}")
+            logger.error("Error fetching products: %s", e)
             logger.info("Skipping this cycle - no real products available")
             return []
 
+# Shared AliExpress client - one connection pool reused by every channel and cycle
+aliexpress_api = AliExpressAPI(APP_KEY, APP_SECRET)
+
+# Prefetch settings - candidates are fetched ahead of the posting slots
+PRODUCTS_PAGE_SIZE = 50  # products per API page
+PREFETCH_PAGES = 3  # pages walked per channel query
+PREFETCH_BUFFER_SIZE = 60  # ready candidates kept per channel
+PREFETCH_LOW_WATERMARK = 6  # refill in the background below this many candidates
+PREFETCH_MAX_AGE = 3 * 3600  # seconds a buffered candidate stays fresh (prices change)
+PREFETCH_INTERVAL = 10 * 60  # seconds between background buffer checks
+SHARED_POOL_PAGES = 4  # trending pages fetched once and routed to every channel
+SHARED_POOL_MAX_PAGE = 20  # deepest trending page before starting over from page 1
+SHARED_POOL_MIN_INTERVAL = 5 * 60  # seconds between shared pool fetches
+
+class CandidateBuffer:
+    """Bounded buffer of filtered, deduplicated products ready to post for one channel"""
+    
+    def __init__(self, max_size: int = PREFETCH_BUFFER_SIZE, max_age: int = PREFETCH_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.config_signature = None
+        self._items: 'OrderedDict[str, tuple]' = OrderedDict()  # product_id -> (fetched_at, product), oldest first
+    
+    def add_many(self, products: List[Dict]) -> int:
+        """Add new candidates, dropping the oldest ones when full - returns how many were added"""
+        now = time.time()
+        added = 0
+        for product in products:
+            key = str(product.get('product_id'))
+            if key in self._items or key in POSTED_PRODUCTS:
+                continue
+            self._items[key] = (now, product)
+            added += 1
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+        return added
+    
+    def _prune(self):
+        """Drop stale candidates and products posted since they were fetched"""
+        cutoff = time.time() - self.max_age
+        for key in [key for key, (fetched_at, _) in self._items.items() if fetched_at < cutoff or key in POSTED_PRODUCTS]:
+            del self._items[key]
+    
+    def candidates(self) -> List[Dict]:
+        """Fresh candidates, oldest first"""
+        self._prune()
+        return [product for _, product in self._items.values()]
+    
+    def fetched_times(self) -> Dict[str, float]:
+        """product_id -> time the candidate was fetched (used to rank fresher prices higher)"""
+        return {key: fetched_at for key, (fetched_at, _) in self._items.items()}
+    
+    def discard(self, products: List[Dict]):
+        """Remove candidates that were taken for posting"""
+        for product in products:
+            self._items.pop(str(product.get('product_id')), None)
+    
+    def clear(self):
+        self._items.clear()
+    
+    def __len__(self) -> int:
+        self._prune()
+        return len(self._items)
+
+class ProductPrefetcher:
+    """Fills per-channel ready buffers from a shared trending pool, topped up by channel-specific queries"""
+    
+    def __init__(self, api: AliExpressAPI):
+        self.api = api
+        self.buffers: Dict[str, CandidateBuffer] = {}
+        self._refills: Dict[str, asyncio.Task] = {}
+        self._shared_refill: Optional[asyncio.Task] = None
+        self._top_ups: set = set()  # background top-ups - referenced so they are not garbage collected
+        self._shared_fetched_at = 0.0
+        self._shared_page = 1  # next trending page - walks deeper on every pool fetch
+    
+    def buffer(self, channel_key: str, channel_config: Dict) -> CandidateBuffer:
+        """Buffer of a channel - emptied when the channel filters changed"""
+        buffer = self.buffers.setdefault(channel_key, CandidateBuffer())
+        signature = channel_filter_signature(channel_config)
+        if buffer.config_signature != signature:
+            buffer.clear()
+            buffer.config_signature = signature
+        return buffer
+    
+    async def refill(self, channel_key: str, channel_config: Dict) -> int:
+        """Refill a channel buffer (concurrent refills of the same channel are coalesced)"""
+        task = self._refills.get(channel_key)
+        if task is None:
+            task = asyncio.ensure_future(self._refill(channel_key, channel_config))
+            self._refills[channel_key] = task
+            task.add_done_callback(lambda _: self._refills.pop(channel_key, None))
+        return await asyncio.shield(task)
+    
+    async def _refill(self, channel_key: str, channel_config: Dict) -> int:
+        buffer = self.buffer(channel_key, channel_config)
+        api_params = self.api._build_query_params(PRODUCTS_PAGE_SIZE, channel_config, channel_key=channel_key)
+        query_keywords = api_params['keywords'].split(',') if 'keywords' in api_params else []
+        added = 0
+        try:
+            query_accepted = []
+            for page_no in range(1, PREFETCH_PAGES + 1):
+                products = await self.api.query_products({**api_params, 'page_no': str(page_no)})
+                accepted = self.api._filter_products(products, channel_config, channel_key)
+                query_accepted.extend(accepted)
+                added += buffer.add_many(accepted)
+                if len(products) < PRODUCTS_PAGE_SIZE or len(buffer) >= buffer.max_size:
+                    break  # last page reached or buffer full
+            # One query however many pages it took, so the yield per query stays comparable across channels
+            KEYWORD_STATS.record_query(channel_key, query_keywords, query_accepted)
+            
+            # Fallback: nothing matched the keyword query - try the plain trending list once
+            if not added and not len(buffer) and query_keywords:
+                KEYWORD_FALLBACKS.inc(channel_key)
+                logger.warning("No products found with keywords for %s, retrying without keywords...", channel_key)
+                fallback_config = {**channel_config, 'keywords': []}
+                fallback_params = self.api._build_query_params(PRODUCTS_PAGE_SIZE, fallback_config)
+                products = await self.api.query_products(fallback_params)
+                added += buffer.add_many(self.api._filter_products(products, fallback_config, channel_key))
+        except AliExpressAPIError as e:
+            logger.error("Prefetch for %s failed: %s", channel_key, e)
+        except Exception as e:
+            logger.error("Error prefetching products for %s: %s", channel_key, e)
+        
+        logger.debug("Prefetched %d new candidates for %s (%d ready)", added, channel_key, len(buffer),
+                     extra={'event': 'prefetch', 'channel': channel_key, 'added': added, 'ready': len(buffer)})
+        return added
+    
+    async def refill_shared(self, channels: Dict[str, Dict]) -> int:
+        """Route one shared trending pool into the channel buffers (coalesced and rate limited)"""
+        if self._shared_refill is None:
+            if time.monotonic() - self._shared_fetched_at < SHARED_POOL_MIN_INTERVAL:
+                return 0
+            self._shared_fetched_at = time.monotonic()
+            self._shared_refill = asyncio.ensure_future(self._refill_shared(channels))
+            self._shared_refill.add_done_callback(lambda _: setattr(self, '_shared_refill', None))
+        return await asyncio.shield(self._shared_refill)
+    
+    async def _refill_shared(self, channels: Dict[str, Dict]) -> int:
+        router = get_channel_router(channels)
+        buffers = {key: self.buffer(key, config) for key, config in channels.items()}
+        # One keyword-less query covering the price range of every channel - the router does the rest
+        pool_config = {
+            'min_price': min(config.get('min_price', 0) for config in channels.values()),
+            'max_price': max(config.get('max_price', 10000) for config in channels.values()),
+            'keywords': [],
+        }
+        api_params = self.api._build_query_params(PRODUCTS_PAGE_SIZE, pool_config)
+        added = Counter()
+        fetched = 0
+        try:
+            for _ in range(SHARED_POOL_PAGES):
+                page_no = self._shared_page
+                products = await self.api.query_products({**api_params, 'page_no': str(page_no)})
+                fetched += len(products)
+                for key, accepted in router.route(products).items():
+                    added[key] += buffers[key].add_many(accepted)
+                
+                last_page = len(products) < PRODUCTS_PAGE_SIZE or page_no >= SHARED_POOL_MAX_PAGE
+                self._shared_page = 1 if last_page else page_no + 1
+                if last_page or all(len(buffer) >= PREFETCH_LOW_WATERMARK for buffer in buffers.values()):
+                    break  # no buffer is low any more
+        except AliExpressAPIError as e:
+            logger.error("Shared pool fetch failed: %s", e)
+        except Exception as e:
+            logger.error("Error fetching the shared product pool: %s", e)
+        
+        logger.info("Shared pool: %d products routed to %d channels", fetched, len(channels),
+                    extra={'event': 'shared_pool', 'fetched': fetched, 'added': {key: added[key] for key in channels}})
+        return sum(added.values())
+    
+    async def top_up(self, channel_key: str, channel_config: Dict, channels: Dict[str, Dict]):
+        """Fill a low buffer - the shared pool first, a channel-specific query only if it still runs dry"""
+        await self.refill_shared(channels)
+        if len(self.buffer(channel_key, channel_config)) < PREFETCH_LOW_WATERMARK:
+            await self.refill(channel_key, channel_config)
+    
+    async def get_candidates(self, channel_key: str, channel_config: Dict) -> List[Dict]:
+        """Ready candidates for posting - goes to the network only when the buffer runs low"""
+        buffer = self.buffer(channel_key, channel_config)
+        if len(buffer) < PREFETCH_LOW_WATERMARK:
+            channels = {**active_channel_configs(), channel_key: channel_config}
+            if not len(buffer):
+                await self.top_up(channel_key, channel_config, channels)
+            else:
+                task = asyncio.ensure_future(self.top_up(channel_key, channel_config, channels))
+                self._top_ups.add(task)
+                task.add_done_callback(self._top_up_done)
+        return buffer.candidates()
+    
+    def _top_up_done(self, task: asyncio.Task):
+        self._top_ups.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background top-up failed: %s", task.exception())
+    
+    async def run(self):
+        """Background loop - top up low buffers between posting slots"""
+        while True:
+            await asyncio.sleep(PREFETCH_INTERVAL)
+            if not BOT_SETTINGS['active']:
+                continue
+            channels = active_channel_configs()
+            if not channels:
+                continue
+            
+            def low_channels():
+                return [
+                    (key, config) for key, config in channels.items()
+                    if len(self.buffer(key, config)) < PREFETCH_LOW_WATERMARK
+                ]
+            
+            # Stay off the network while every buffer still has enough candidates
+            if not low_channels():
+                continue
+            await self.refill_shared(channels)
+            semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+            
+            async def refill_one(channel_key: str, channel_config: Dict):
+                async with semaphore:
+                    await self.refill(channel_key, channel_config)
+            
+            await asyncio.gather(*(refill_one(key, config) for key, config in low_channels()), return_exceptions=True)
+
+def active_channel_configs() -> Dict[str, Dict]:
+    """Configs of this worker's channels currently enabled by the admin"""
+    return {key: config for key, config in CHANNELS_CONFIG.items() if config.get('active', False) and owns_channel(key)}
+
+# Shared prefetcher - per-channel candidate buffers
+PREFETCHER = ProductPrefetcher(aliexpress_api)
+
+# URL shortener settings
+SHORTENER_BACKEND = os.getenv('SHORTENER_BACKEND', 'tinyurl')  # tinyurl or local
+SHORTENER_TIMEOUT = 5  # seconds
+SHORTENER_CONCURRENCY = 5  # parallel shortening requests when pre-shortening a cycle
+SHORT_LINK_TTL = 30 * 24 * 3600  # seconds a cached short link is kept
+
+class TinyURLBackend:
+    """Shortener backend using the public TinyURL API"""
+    
+    api_url = 'https://tinyurl.com/api-create.php'
+    
+    async def shorten(self, client: httpx.AsyncClient, long_url: str) -> Optional[str]:
+        response = await client.get(self.api_url, params={'url': long_url})
+        short_url = response.text.strip()
+        if response.status_code == 200 and short_url.startswith('http'):
+            return short_url
+        return None
+
+class LocalShortenerBackend:
+    """Offline shortener backend - deterministic local links for tests and benchmarks"""
+    
+    def __init__(self, base_url: str = 'https://short.local/'):
+        self.base_url = base_url
+    
+    async def shorten(self, client: httpx.AsyncClient, long_url: str) -> Optional[str]:
+        return self.base_url + hashlib.sha1(long_url.encode('utf-8')).hexdigest()[:10]
+
+class LinkShortener:
+    """Async link shortener with a persistent promotion_link -> short_url cache"""
+    
+    def __init__(self, backend, db_path: str = STATE_DB_PATH):
+        self.backend = backend
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._conn = open_state_db(db_path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS short_links (long_url TEXT PRIMARY KEY, short_url TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._conn.execute('DELETE FROM short_links WHERE created_at < ?', (time.time() - SHORT_LINK_TTL,))
+        self._conn.commit()
+        self._cache: Dict[str, str] = dict(self._conn.execute('SELECT long_url, short_url FROM short_links'))
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=SHORTENER_TIMEOUT, follow_redirects=True)
+        return self._client
+    
+    def get_cached(self, long_url: str) -> Optional[str]:
+        return self._cache.get(long_url)
+    
+    async def _shorten_remote(self, long_url: str) -> str:
+        started = time.perf_counter()
+        try:
+            short_url = await self.backend.shorten(self._get_client(), long_url)
+        except Exception as e:
+            SHORTENER_LATENCY.observe(time.perf_counter() - started, 'error')
+            logger.warning("Error shortening URL: %s, using original", e)
+            return long_url
+        SHORTENER_LATENCY.observe(time.perf_counter() - started, 'ok' if short_url else 'failed')
+        if not short_url:
+            logger.warning("Failed to shorten URL, using original")
+            return long_url
+        
+        self._cache[long_url] = short_url
+        try:
+            with self._conn:
+                self._conn.execute('INSERT OR REPLACE INTO short_links (long_url, short_url, created_at) VALUES (?, ?, ?)',
+                                   (long_url, short_url, time.time()))
+        except sqlite3.Error as e:
+            logger.error("Error saving short link: %s", e)
+        logger.debug("URL shortened: %s", short_url)
+        return short_url
+    
+    async def shorten(self, long_url: str) -> str:
+        """Short link for a URL (cached, concurrent calls for the same URL share one request)"""
+        if not long_url:
+            return long_url
+        cached = self._cache.get(long_url)
+        if cached:
+            return cached
+        task = self._inflight.get(long_url)
+        if task is None:
+            task = asyncio.ensure_future(self._shorten_remote(long_url))
+            self._inflight[long_url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(long_url, None))
+        return await asyncio.shield(task)
+    
+    async def shorten_many(self, long_urls: List[str]) -> Dict[str, str]:
+        """Shorten many URLs concurrently (bounded) - used to pre-shorten a whole cycle"""
+        semaphore = asyncio.Semaphore(SHORTENER_CONCURRENCY)
+        
+        async def shorten_one(long_url: str) -> str:
+            async with semaphore:
+                return await self.shorten(long_url)
+        
+        unique_urls = [url for url in dict.fromkeys(long_urls) if url]
+        short_urls = await asyncio.gather(*(shorten_one(url) for url in unique_urls))
+        return dict(zip(unique_urls, short_urls))
+    
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+# Shared link shortener - each promotion link is shortened only once
+LINK_SHORTENER = LinkShortener(LocalShortenerBackend() if SHORTENER_BACKEND == 'local' else TinyURLBackend())
+
+# Product image settings
+PHOTO_CACHE_SIZE = 20000  # remembered image URL -> Telegram file_id pairs
+IMAGE_CHECK_TIMEOUT = 5  # seconds
+IMAGE_CHECK_CONCURRENCY = 8  # parallel image URL checks when preparing a cycle
+IMAGE_CHECK_TTL = 3600  # seconds an image check result is reused
+IMAGE_MAX_BYTES = 5 * 1024 * 1024  # Telegram only fetches photos up to 5 MB by URL
+
+class PhotoCache:
+    """Persistent image URL / product_id -> Telegram file_id cache, so each image is uploaded only once"""
+    
+    def __init__(self, db_path: str = STATE_DB_PATH, max_size: int = PHOTO_CACHE_SIZE):
+        self._conn = open_state_db(db_path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS photo_file_ids (image_url TEXT PRIMARY KEY, product_id TEXT, '
+            'file_id TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+        # Keep only the newest entries
+        self._conn.execute(
+            'DELETE FROM photo_file_ids WHERE image_url NOT IN '
+            '(SELECT image_url FROM photo_file_ids ORDER BY created_at DESC LIMIT ?)', (max_size,)
+        )
+        self._conn.commit()
+        self._by_url: Dict[str, str] = {}
+        self._by_product: Dict[str, str] = {}
+        for image_url, product_id, file_id in self._conn.execute('SELECT image_url, product_id, file_id FROM photo_file_ids'):
+            self._by_url[image_url] = file_id
+            if product_id:
+                self._by_product[product_id] = file_id
+    
+    def get(self, image_url: str, product_id=None) -> Optional[str]:
+        return self._by_url.get(image_url) or (self._by_product.get(str(product_id)) if product_id else None)
+    
+    def store(self, image_url: str, product_id, file_id: str):
+        self._by_url[image_url] = file_id
+        if product_id:
+            self._by_product[str(product_id)] = file_id
+        try:
+            with self._conn:
+                self._conn.execute('INSERT OR REPLACE INTO photo_file_ids (image_url, product_id, file_id, created_at) '
+                                   'VALUES (?, ?, ?, ?)', (image_url, str(product_id) if product_id else None, file_id, time.time()))
+        except sqlite3.Error as e:
+            logger.error("Error saving photo file_id: %s", e)
+    
+    def forget(self, image_url: str, product_id=None):
+        """Drop a file_id Telegram no longer accepts"""
+        self._by_url.pop(image_url, None)
+        if product_id:
+            self._by_product.pop(str(product_id), None)
+        try:
+            with self._conn:
+                self._conn.execute('DELETE FROM photo_file_ids WHERE image_url = ?', (image_url,))
+        except sqlite3.Error as e:
+            logger.error("Error removing photo file_id: %s", e)
+    
+    def __len__(self) -> int:
+        return len(self._by_url)
+    
+    def close(self):
+        self._conn.close()
+
+class ImageValidator:
+    """Checks product image URLs ahead of posting, so dead images are posted as text instead"""
+    
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._results: Dict[str, tuple] = {}  # image_url -> (checked_at, usable)
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=IMAGE_CHECK_TIMEOUT, follow_redirects=True, transport=self._transport)
+        return self._client
+    
+    async def _check(self, image_url: str) -> bool:
+        client = self._get_client()
+        try:
+            response = await client.head(image_url)
+            if response.status_code in (403, 405):
+                # Some CDNs refuse HEAD - fetch a single byte instead
+                response = await client.get(image_url, headers={'Range': 'bytes=0-0'})
+        except httpx.HTTPError as e:
+            logger.warning("Image check failed for %s: %s", image_url, e)
+            return False
+        if response.status_code not in (200, 206):
+            logger.warning("Image unavailable (%s): %s", response.status_code, image_url)
+            return False
+        if not response.headers.get('content-type', '').startswith('image/'):
+            logger.warning("Not an image (%s): %s", response.headers.get('content-type'), image_url)
+            return False
+        length = response.headers.get('content-length')
+        if response.status_code == 200 and length and length.isdigit() and int(length) > IMAGE_MAX_BYTES:
+            logger.warning("Image too large for Telegram (%s bytes): %s", length, image_url)
+            return False
+        return True
+    
+    def usable(self, image_url: str) -> bool:
+        """False only for images known to be broken - unchecked images are tried"""
+        result = self._results.get(image_url)
+        return result is None or result[1]
+    
+    def mark_bad(self, image_url: str):
+        self._results[image_url] = (time.time(), False)
+    
+    async def validate_many(self, image_urls: List[str]) -> Dict[str, bool]:
+        """Check many image URLs concurrently (results are reused for IMAGE_CHECK_TTL)"""
+        now = time.time()
+        self._results = {url: result for url, result in self._results.items() if now - result[0] < IMAGE_CHECK_TTL}
+        pending = [url for url in dict.fromkeys(image_urls) if url and url not in self._results]
+        semaphore = asyncio.Semaphore(IMAGE_CHECK_CONCURRENCY)
+        
+        async def check_one(image_url: str) -> bool:
+            async with semaphore:
+                return await self._check(image_url)
+        
+        for image_url, usable in zip(pending, await asyncio.gather(*(check_one(url) for url in pending))):
+            self._results[image_url] = (now, usable)
+        return {url: self.usable(url) for url in image_urls if url}
+    
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+PHOTO_CACHE = PhotoCache()
+IMAGE_VALIDATOR = ImageValidator()
+
+# Telegram flood limits used by the outbound send queue
+TELEGRAM_GLOBAL_RATE = 25  # messages per second across all chats (Telegram allows ~30)
+TELEGRAM_CHANNEL_RATE = 20 / 60  # messages per second to one channel or group
+TELEGRAM_PRIVATE_RATE = 1  # messages per second to one private chat
+TELEGRAM_PRIVATE_BURST = 3  # short bursts allowed to a private chat (admin panel clicks)
+TELEGRAM_SEND_RETRIES = 5  # retries for transient network errors
+TELEGRAM_CONNECTION_POOL = 8  # parallel HTTP connections to the Bot API
+
+# Send priorities - lower values are sent first
+PRIORITY_ADMIN = 0
+PRIORITY_PROGRESS = 5  # background job status - button responses overtake it
+PRIORITY_POST = 10
+
+class TokenBucket:
+    """Async token bucket rate limiter"""
+    
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def pause(self, seconds: float):
+        """Block the bucket (Telegram asked us to wait)"""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self.updated = now
+
+def telegram_request_not_sent(error: NetworkError) -> bool:
+    """True when the request failed before reaching Telegram (connect or pool errors), so resending cannot duplicate it"""
+    cause = error.__cause__
+    return isinstance(cause, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+class TelegramSendQueue:
+    """Single outbound queue for Telegram sends - flood limits, RetryAfter, retries and priorities"""
+    
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets: Dict = {}
+        self._lanes: Dict = {}  # chat_id -> heap of pending requests, sent in order per chat
+        self._lane_tasks: Dict = {}
+        self._waiting = Counter()  # priorities waiting for the global bucket
+        self._seq = itertools.count()
+        self.retry_after_waits = 0
+        self.retries = 0
+    
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            private_chat = isinstance(chat_id, int) and chat_id > 0
+            if private_chat:
+                bucket = TokenBucket(TELEGRAM_PRIVATE_RATE, TELEGRAM_PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(TELEGRAM_CHANNEL_RATE)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    async def call(self, method: str, chat_id, priority: int = PRIORITY_POST, **kwargs):
+        """Queue a Bot API call for a chat and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._lanes.setdefault(chat_id, []), (priority, next(self._seq), method, kwargs, future))
+        if chat_id not in self._lane_tasks:
+            self._lane_tasks[chat_id] = asyncio.create_task(self._run_lane(chat_id))
+        with TELEGRAM_SEND_LATENCY.time(method):
+            return await future
+    
+    async def send_message(self, chat_id, text: str, priority: int = PRIORITY_POST, **kwargs):
+        return await self.call('send_message', chat_id, priority, text=text, **kwargs)
+    
+    async def send_photo(self, chat_id, photo, priority: int = PRIORITY_POST, **kwargs):
+        return await self.call('send_photo', chat_id, priority, photo=photo, **kwargs)
+    
+    async def edit_message_text(self, chat_id, message_id: int, text: str, priority: int = PRIORITY_ADMIN, **kwargs):
+        return await self.call('edit_message_text', chat_id, priority, message_id=message_id, text=text, **kwargs)
+    
+    async def _run_lane(self, chat_id):
+        """Send the queued requests of one chat, highest priority first"""
+        lane = self._lanes[chat_id]
+        try:
+            while lane:
+                priority, _, method, kwargs, future = heapq.heappop(lane)
+                if not future.done():
+                    await self._send(chat_id, priority, method, kwargs, future)
+        finally:
+            self._lane_tasks.pop(chat_id, None)
+            if not lane:
+                self._lanes.pop(chat_id, None)
+    
+    async def _acquire_global(self, priority: int):
+        """Take a global token - waiting higher-priority sends go first"""
+        self._waiting[priority] += 1
+        try:
+            while any(count and waiting < priority for waiting, count in self._waiting.items()):
+                await asyncio.sleep(0.05)
+            await self._global_bucket.acquire()
+        finally:
+            self._waiting[priority] -= 1
+    
+    async def _send(self, chat_id, priority: int, method: str, kwargs: Dict, future: asyncio.Future):
+        attempt = 0
+        while True:
+            await self._chat_bucket(chat_id).acquire()
+            await self._acquire_global(priority)
+            try:
+                with TELEGRAM_API_LATENCY.time(method):
+                    result = await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                # Flood limit hit - wait exactly as long as Telegram asks, then resend
+                self.retry_after_waits += 1
+                TELEGRAM_RETRY_AFTER.inc()
+                TELEGRAM_RETRY_AFTER_WAIT.inc(amount=e.retry_after)
+                logger.warning("Telegram flood limit for %s, retrying in %ss", chat_id, e.retry_after)
+                self._chat_bucket(chat_id).pause(e.retry_after)
+                continue
+            except BadRequest as e:
+                # Permanent (e.g. "Message is not modified") - report to the caller
+                if not future.done():  # the caller may have been cancelled meanwhile
+                    future.set_exception(e)
+                return
+            except NetworkError as e:
+                attempt += 1
+                # A timed out send_* may already have been posted - only resend when it never left
+                if attempt > TELEGRAM_SEND_RETRIES or (method.startswith('send_') and not telegram_request_not_sent(e)):
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                self.retries += 1
+                backoff = min(30, 2 ** attempt) * random.uniform(0.5, 1)
+                logger.warning("Transient Telegram error for %s: %s, retry %s in %.1fs", chat_id, e, attempt, backoff)
+                await asyncio.sleep(backoff)
+                continue
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+            return
+    
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+    
+    async def close(self):
+        for task in list(self._lane_tasks.values()):
+            task.cancel()
+        await self.bot.shutdown()
+
+# Shared bot and outbound send queue - every send/edit goes through it
+TELEGRAM_SENDER = TelegramSendQueue(
+    Bot(token=TELEGRAM_BOT_TOKEN, request=HTTPXRequest(connection_pool_size=TELEGRAM_CONNECTION_POOL))
+)
+METRICS.gauge('telegram_queue_pending', 'Telegram sends waiting in the send queue', func=lambda: TELEGRAM_SENDER.pending())
+
 class TelegramPoster:
     """Handler for posting to Telegram channel"""
     
-    def __init__(self, bot_token: str, channel_id: str):
-        self.bot = Bot(token=bot_token)
+    def __init__(self, channel_id: str, sender: Optional[TelegramSendQueue] = None):
+        self.sender = sender or TELEGRAM_SENDER
         self.channel_id = channel_id
     
-    def shorten_url(self, long_url: str) -> str:
-        """Shorten URL using TinyURL API"""
+    async def shorten_url(self, long_url: str) -> str:
+        """Shorten URL using the shared (cached) link shortener"""
+        return await LINK_SHORTENER.shorten(long_url)
+    
+    async def _send_photo(self, photo: str, caption: str, reply_markup: InlineKeyboardMarkup,
+                          image_url: str, product_id, cached: bool) -> bool:
+        """Send a product photo (file_id or URL) - False when Telegram rejects it"""
         try:
-            response = requests.get(f'http://tinyurl.com/api-create.php?url={urllib.parse.quote(long_url)}', timeout=5)
-            if response.status_code == 200:
-                short_url = response.text.strip()
-                logger.info(f"URL shortened: {short_url}")
-                return short_url
+            message = await self.sender.send_photo(chat_id=self.channel_id, photo=photo, caption=caption, reply_markup=reply_markup)
+        except BadRequest as e:
+            logger.warning("Telegram rejected %s of %s: %s", 'cached photo' if cached else 'image', product_id, e)
+            if cached:
+                PHOTO_CACHE.forget(image_url, product_id)
             else:
-                logger.warning(f"Failed to shorten URL, using original")
-                return long_url
-        except Exception as e:
-            logger.warning(f"Error shortening URL: {e}, using original")
-            return long_url
+                IMAGE_VALIDATOR.mark_bad(image_url)
+            return False
+        if not cached and getattr(message, 'photo', None):
+            # Largest size - reused for every later post of this image
+            PHOTO_CACHE.store(image_url, product_id, message.photo[-1].file_id)
+        PHOTO_SENDS.inc('file_id' if cached else 'url')
+        return True
     
     async def post_product(self, product: Dict) -> bool:
         """Post a single product to the Telegram channel"""
+        product_id = product.get('product_id')
+        
+        # Check if already posted or being posted by another channel (double-check)
+        if product_id in POSTED_PRODUCTS or product_id in POSTS_IN_FLIGHT or not POSTED_PRODUCTS.claim(product_id):
+            logger.debug("Product %s already posted, skipping", product_id)
+            return False
+        POSTS_IN_FLIGHT.add(product_id)
+        
         try:
             # Extract product information
-            product_id = product.get('product_id')
             title = product.get('product_title', 'منتج رائع')
             price = product.get('target_sale_price', '0')
             original_price = product.get('target_original_price', price)
@@ -702,12 +2316,7 @@ class TelegramPoster:
             promotion_link = product.get('promotion_link', '')
             
             # Shorten the URL for cleaner links
-            short_link = self.shorten_url(promotion_link)
-            
-            # Check if already posted (double-check)
-            if product_id in POSTED_PRODUCTS:
-                logger.warning(f"Product {product_id} already posted, skipping")
-                return False
+            short_link = await self.shorten_url(promotion_link)
             
             # Calculate discount
             try:
@@ -730,214 +2339,417 @@ class TelegramPoster:
 ✨ Limited Time Offer!
 ⚡ Shop Now & Save Big!"""
             
-            # Send message with image and details combined
-            if image_url:
-                await self.bot.send_photo(
-                    chat_id=self.channel_id,
-                    photo=image_url,
-                    caption=caption,
-                    reply_markup=reply_markup
-                )
-            else:
-                # Send text only if no image
-                await self.bot.send_message(
+            # Send message with image and details combined - the cached Telegram file_id first,
+            # then the image URL unless it is known to be broken
+            sent = False
+            file_id = PHOTO_CACHE.get(image_url, product_id) if image_url else None
+            if file_id:
+                sent = await self._send_photo(file_id, caption, reply_markup, image_url, product_id, cached=True)
+            if not sent and image_url and IMAGE_VALIDATOR.usable(image_url):
+                sent = await self._send_photo(image_url, caption, reply_markup, image_url, product_id, cached=False)
+            if not sent:
+                # Send text only if no (working) image
+                await self.sender.send_message(
                     chat_id=self.channel_id,
                     text=caption,
                     reply_markup=reply_markup,
                     disable_web_page_preview=False
                 )
+                PHOTO_SENDS.inc('text')
             
-            logger.info(f"Successfully posted product: {title[:50]}...")
+            logger.debug("Posted product %s: %.50s", product_id, title)
             
-            # Add product to posted history
+            # Add product to posted history (oldest entries are evicted automatically)
             POSTED_PRODUCTS.add(product_id)
             
-            # Manage history size - remove oldest if exceeds limit
-            if len(POSTED_PRODUCTS) > MAX_POSTED_HISTORY:
-                # Remove approximately 20% of oldest entries
-                remove_count = int(MAX_POSTED_HISTORY * 0.2)
-                for _ in range(remove_count):
-                    POSTED_PRODUCTS.pop()
-            
             return True
             
         except TelegramError as e:
-            logger.error(f"Telegram error posting product: {e}")
+            logger.error("Telegram error posting product: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Error posting product: {e}")
+            logger.error("Error posting product: %s", e)
             return False
+        finally:
+            POSTS_IN_FLIGHT.discard(product_id)
+            POSTED_PRODUCTS.release(product_id)
+
+async def fetch_channel_products(channel_key: str, channel_config: Dict, semaphore: asyncio.Semaphore) -> List[Dict]:
+    """Ready candidates for one channel - from its prefetch buffer, refilled under the shared semaphore"""
+    if not BOT_SETTINGS['active']:
+        logger.info("Bot is paused by admin")
+        return []
+    async with semaphore:
+        return await PREFETCHER.get_candidates(channel_key, channel_config)
+
+# Product ranking - every signal is scaled to 0..1 before weighting
+SCORE_DISCOUNT_CAP = 90  # % off - deeper discounts score the same
+SCORE_COMMISSION_CAP = 20  # % commission
+SCORE_VOLUME_CAP = math.log1p(10000)  # recent sales, log scaled
+
+def product_scorer(channel_config: Dict, fetched_at: Optional[Dict[str, float]] = None) -> Callable[[Dict], float]:
+    """Score function for a channel's candidates: weighted discount, commission, rating, sales and freshness"""
+    weights = {**SCORE_WEIGHTS, **channel_config.get('score_weights', {})}
+    total = sum(weights.values()) or 1.0
+    w_discount, w_commission, w_rating, w_volume, w_freshness = (weights[name] / total for name in SCORE_WEIGHTS)
+    noise = channel_config.get('score_noise', SCORE_NOISE)
+    fetched_at = fetched_at or {}
+    now = time.time()
+    
+    def score(product: Dict) -> float:
+        fields = _product_fields(product)
+        if fields is None:
+            return -1.0
+        age = now - fetched_at.get(str(fields['product_id']), now)
+        value = (w_discount * min(max(fields['discount'], 0.0), SCORE_DISCOUNT_CAP) / SCORE_DISCOUNT_CAP
+                 + w_commission * min(fields['commission'], SCORE_COMMISSION_CAP) / SCORE_COMMISSION_CAP
+                 + w_rating * min(fields['rating'], 100.0) / 100
+                 + w_volume * min(math.log1p(max(fields['volume'], 0.0)) / SCORE_VOLUME_CAP, 1.0)
+                 + w_freshness * max(0.0, 1 - age / PREFETCH_MAX_AGE))
+        return value + random.uniform(0, noise) if noise else value
+    
+    return score
+
+def select_products(channel_key: str, channel_config: Dict, products: List[Dict],
+                    fetched_at: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """Select the best scored products to post (more for Hot Finds, less for others)"""
+    if channel_key == 'hot_deals':
+        # Hot Finds: post 3-6 products for variety
+        num_to_post = random.randint(min(3, len(products)), min(6, len(products)))
+    else:
+        # Other channels: 1-3 products
+        num_to_post = random.randint(1, min(3, len(products)))
+    
+    # Top k with a heap - O(n log k), cheap even for pools of thousands of candidates
+    return heapq.nlargest(num_to_post, products, key=product_scorer(channel_config, fetched_at))
+
+async def post_channel_products(channel_key: str, channel_config: Dict, selected_products: List[Dict]) -> int:
+    """Post the selected products to one channel (paced by the send queue flood limits)"""
+    # Initialize telegram poster for this channel
+    telegram = TelegramPoster(channel_config['channel_id'])
+    num_to_post = len(selected_products)
+    
+    posted_count = 0
+    for product in selected_products:
+        if await telegram.post_product(product):
+            posted_count += 1
+            KEYWORD_STATS.record_posted(channel_key, product)
+    
+    logger.debug("Posted %d/%d products to %s", posted_count, num_to_post, channel_key)
+    POSTS_TOTAL.inc(channel_key, amount=posted_count)
+    return posted_count
+
+# One run per channel at a time - an admin test of a channel queues behind its scheduled run and vice versa
+CHANNEL_LOCKS: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+async def report_progress(progress: Optional[Callable[[str], Awaitable]], text: str):
+    """Send a progress line to the caller of a posting cycle (never fails the cycle)"""
+    if progress is None:
+        return
+    try:
+        await progress(text)
+    except Exception as e:
+        logger.warning("Could not report progress: %s", e)
+
+async def post_products_job(channel_keys: Optional[List[str]] = None,
+                            progress: Optional[Callable[[str], Awaitable]] = None) -> int:
+    """Post products job for the given channels (this worker's active channels by default), returns posts made"""
+    if channel_keys is None:
+        # Channels of other workers are posted by their owner, under the owner's run lock
+        channel_keys = [key for key in CHANNELS_CONFIG if owns_channel(key)]
+    
+    active_channels = []
+    for channel_key in channel_keys:
+        channel_config = CHANNELS_CONFIG[channel_key]
+        if not channel_config.get('active', False):
+            logger.info("Channel '%s' is inactive, skipping", channel_config['name'])
+            continue
+        active_channels.append((channel_key, channel_config))
+    
+    async with channel_locks([key for key, _ in active_channels], progress):
+        return await _run_posting_cycle(active_channels, progress)
 
-async def post_products_job():
-    """Post products job for all active channels"""
+async def run_channel(channel_key: str, force: bool = False,
+                      progress: Optional[Callable[[str], Awaitable]] = None) -> int:
+    """Fetch, filter, select and post for exactly one channel - `force` runs it even when disabled"""
+    channel_config = CHANNELS_CONFIG[channel_key]
+    if not force and not channel_config.get('active', False):
+        logger.info("Channel '%s' is inactive, skipping", channel_config['name'])
+        return 0
+    async with channel_locks([channel_key], progress):
+        return await _run_posting_cycle([(channel_key, channel_config)], progress)
+
+@contextlib.asynccontextmanager
+async def channel_locks(channel_keys: List[str], progress: Optional[Callable[[str], Awaitable]] = None):
+    """Hold the run locks of several channels (taken in a fixed order, so runs never deadlock)"""
+    if any(CHANNEL_LOCKS[key].locked() for key in channel_keys):
+        logger.info("Waiting for running posts of: %s", ', '.join(key for key in channel_keys if CHANNEL_LOCKS[key].locked()))
+        await report_progress(progress, "⏳ بانتظار انتهاء دورة النشر الحالية...")
+    async with contextlib.AsyncExitStack() as stack:
+        for key in sorted(channel_keys):
+            await stack.enter_async_context(CHANNEL_LOCKS[key])
+        yield
+
+def log_channel_cycle(channel_key: str, filter_before: Counter, candidates: int, selected: int, posted: int, duration: float):
+    """One summary record per channel and cycle instead of a line per step and product"""
+    stats = FILTER_STATS[channel_key] - filter_before
+    rejected = {reason: count for reason, count in stats.items() if reason not in ('seen', 'accepted')}
+    logger.info("Cycle %s: %d candidates, %d selected, %d posted (%d fetched, %d accepted) in %.1fs",
+                channel_key, candidates, selected, posted, stats['seen'], stats['accepted'], duration,
+                extra={'event': 'channel_cycle', 'channel': channel_key, 'candidates': candidates, 'selected': selected,
+                       'posted': posted, 'fetched': stats['seen'], 'accepted': stats['accepted'],
+                       'rejected': rejected, 'duration': round(duration, 3)})
+
+async def _run_posting_cycle(active_channels: List[tuple], progress: Optional[Callable[[str], Awaitable]]) -> int:
+    """Fetch, select and post for the given (channel_key, config) pairs - callers hold their channel locks"""
+    total_posted = 0
+    started = time.perf_counter()
+    channel_keys = [key for key, _ in active_channels]
+    filter_before = {key: Counter(FILTER_STATS[key]) for key in channel_keys}
+    candidates = dict.fromkeys(channel_keys, 0)
+    selected_counts = dict.fromkeys(channel_keys, 0)
+    posted_counts = dict.fromkeys(channel_keys, 0)
     try:
-        logger.info("Starting scheduled product posting job for all channels...")
+        logger.debug("Starting product posting job for: %s", ', '.join(channel_keys))
+        POSTED_PRODUCTS.sync()  # products other workers posted since the last cycle
         
-        # Initialize API handler
-        aliexpress_api = AliExpressAPI(APP_KEY, APP_SECRET)
+        # Fetch phase: query every active channel at once (bounded concurrency)
+        await report_progress(progress, f"🔍 جلب المنتجات لـ {len(active_channels)} قناة...")
+        semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        results = await asyncio.gather(
+            *(fetch_channel_products(key, config, semaphore) for key, config in active_channels),
+            return_exceptions=True
+        )
         
-        # Process each channel
-        for channel_key, channel_config in CHANNELS_CONFIG.items():
-            if not channel_config.get('active', False):
-                logger.info(f"Channel '{channel_config['name']}' is inactive, skipping")
+        # Selection phase - a routed product can sit in several channel buffers, each one is posted once
+        selections = []
+        claimed = set()
+        for (channel_key, channel_config), products in zip(active_channels, results):
+            if isinstance(products, Exception):
+                logger.error("Error fetching products for %s: %s", channel_config['name'], products)
                 continue
-            
-            logger.info(f"\n{'='*60}")
-            logger.info(f"Processing channel: {channel_config['name']} ({channel_key})")
-            logger.info(f"Channel ID: {channel_config['channel_id']}")
-            
-            # Get products with channel-specific filters (higher page_size = more variety)
-            products = aliexpress_api.get_hot_products(page_size=50, channel_config=channel_config)
-            
+            products = [product for product in products if str(product.get('product_id')) not in claimed]
+            candidates[channel_key] = len(products)
             if not products:
-                logger.info(f"No products found for {channel_config['name']}, skipping")
                 continue
-            
-            logger.info(f"Fetched {len(products)} products for {channel_config['name']}")
-            
-            # Initialize telegram poster for this channel
-            telegram = TelegramPoster(TELEGRAM_BOT_TOKEN, channel_config['channel_id'])
-            
-            # Randomly select products to post (more for Hot Finds, less for others)
-            if channel_key == 'hot_deals':
-                # Hot Finds: post 3-6 products for variety
-                num_to_post = random.randint(3, min(6, len(products)))
-            else:
-                # Other channels: 1-3 products
-                num_to_post = random.randint(1, min(3, len(products)))
-            
-            selected_products = random.sample(products, num_to_post)
-            
-            posted_count = 0
-            for product in selected_products:
-                if await telegram.post_product(product):
-                    posted_count += 1
-                    # Random delay between posts (3-8 seconds) - more human-like
-                    delay = random.randint(3, 8)
-                    await asyncio.sleep(delay)
-            
-            logger.info(f"Posted {posted_count}/{num_to_post} products to {channel_config['name']}")
-            
-            # Random delay between channels (8-15 seconds) - more natural
-            channel_delay = random.randint(8, 15)
-            await asyncio.sleep(channel_delay)
+            selected = select_products(channel_key, channel_config, products, PREFETCHER.buffers[channel_key].fetched_times())
+            PREFETCHER.buffers[channel_key].discard(selected)
+            claimed.update(str(product.get('product_id')) for product in selected)
+            selected_counts[channel_key] = len(selected)
+            selections.append((channel_key, channel_config, selected))
+        
+        # Pre-shorten every selected link and check images without a cached file_id concurrently,
+        # so posting only hits the caches
+        selected_products = [product for _, _, selected in selections for product in selected]
+        await asyncio.gather(
+            LINK_SHORTENER.shorten_many([product.get('promotion_link', '') for product in selected_products]),
+            IMAGE_VALIDATOR.validate_many([
+                product.get('product_main_image_url', '') for product in selected_products
+                if not PHOTO_CACHE.get(product.get('product_main_image_url', ''), product.get('product_id'))
+            ])
+        )
         
-        logger.info(f"\n{'='*60}")
-        logger.info("Completed posting job for all channels")
+        # Post phase: channels post in parallel, the send queue paces each channel
+        await report_progress(progress, f"📤 نشر {sum(len(selected) for _, _, selected in selections)} منتج في {len(selections)} قناة...")
+        post_tasks = [post_channel_products(key, config, selected) for key, config, selected in selections]
+        posted = await asyncio.gather(*post_tasks, return_exceptions=True)
+        for (channel_key, _, _), result in zip(selections, posted):
+            if isinstance(result, Exception):
+                logger.error("Error posting products: %s", result)
+            else:
+                posted_counts[channel_key] = result
+                total_posted += result
         
     except Exception as e:
-        logger.error(f"Error in posting job: {e}")
+        logger.error("Error in posting job: %s", e)
+    finally:
+        POSTED_PRODUCTS.flush()
+        duration = time.perf_counter() - started
+        CYCLE_DURATION.observe(duration)
+        for key in channel_keys:
+            log_channel_cycle(key, filter_before[key], candidates[key], selected_counts[key], posted_counts[key], duration)
+    return total_posted
 
-async def handle_admin_commands():
-    """Handle admin commands with inline keyboard control panel"""
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
-    last_update_id = 0
+ADMIN_WORKER_IDLE = 60  # seconds before an idle per-chat admin worker exits
+ADMIN_SLOW_UPDATE = 1.0  # seconds - admin updates slower than this are logged
+
+def update_chat_id(update) -> Optional[int]:
+    """Chat an admin update belongs to"""
+    if update.callback_query and update.callback_query.message:
+        return update.callback_query.message.chat_id
+    if update.message:
+        return update.message.chat_id
+    return None
+
+class AdminDispatcher:
+    """Runs admin updates in supervised tasks - in order per chat, concurrently across chats"""
     
-    while True:
-        try:
-            updates = await bot.get_updates(offset=last_update_id + 1, timeout=5)
+    def __init__(self, handler: Callable[..., Awaitable], idle_timeout: float = ADMIN_WORKER_IDLE):
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+    
+    def dispatch(self, update):
+        """Queue an update for its chat worker, never blocks the poller"""
+        user = update.effective_user
+        chat_id = update_chat_id(update)
+        if chat_id is None or not user or user.id not in ADMIN_USER_IDS:
+            return
+        queue = self.queues.setdefault(chat_id, asyncio.Queue())
+        queue.put_nowait(update)
+        worker = self.workers.get(chat_id)
+        if worker is None or worker.done():
+            # Start (or restart after a crash) the worker of this chat
+            worker = asyncio.create_task(self._worker(chat_id, queue))
+            worker.add_done_callback(self._worker_done)
+            self.workers[chat_id] = worker
+    
+    async def _worker(self, chat_id: int, queue: asyncio.Queue):
+        while True:
+            try:
+                update = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    # Idle - forget this chat until its next update
+                    self.queues.pop(chat_id, None)
+                    self.workers.pop(chat_id, None)
+                    return
+                continue
             
-            for update in updates:
-                last_update_id = update.update_id
-                
-                # Handle callback queries (button clicks)
-                if update.callback_query:
-                    query = update.callback_query
-                    if query.from_user.id not in ADMIN_USER_IDS:
-                        continue
-                    
-                    callback_data = query.data
-                    chat_id = query.message.chat_id
-                    message_id = query.message.message_id
-                    
-                    # Global controls
-                    if callback_data == 'main_menu':
-                        keyboard = [
-                            [InlineKeyboardButton("📺 التحكم بالقنوات", callback_data='channels_menu')],
-                            [InlineKeyboardButton("📊 الإحصائيات", callback_data='stats'),
-                             InlineKeyboardButton("🧪 اختبار فوري", callback_data='test')],
-                            [InlineKeyboardButton("🔴 إيقاف البوت" if BOT_SETTINGS['active'] else "🟢 تشغيل البوت", callback_data='toggle_bot')],
-                            [InlineKeyboardButton("🔄 مسح السجل", callback_data='reset_duplicates')]
-                        ]
-                        status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
-                        message = f"""🎛️ **لوحة التحكم الرئيسية**
+            started = time.monotonic()
+            try:
+                await self.handler(update)
+            except Exception as e:
+                # Ignore "message not modified" errors - they're not critical
+                if "Message is not modified" not in str(e):
+                    logger.error("Error handling admin update %d: %s", update.update_id, e)
+            elapsed = time.monotonic() - started
+            if elapsed > ADMIN_SLOW_UPDATE:
+                logger.warning("Admin update %d took %.2fs", update.update_id, elapsed)
+    
+    def _worker_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error("Admin worker crashed: %s", task.exception())
+    
+    async def close(self):
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.workers.clear()
+        self.queues.clear()
 
-📊 **الحالة:** {status}
-📦 **منتجات منشورة:** {len(POSTED_PRODUCTS)}
+class AdminJobs:
+    """Long-running admin actions run as background tasks that report progress in a status message"""
+    
+    def __init__(self):
+        self.running: Dict[str, asyncio.Task] = {}
+    
+    def is_running(self, name: str) -> bool:
+        return name in self.running
+    
+    async def start(self, name: str, chat_id: int, title: str, action: Callable[..., Awaitable]) -> bool:
+        """Start `action(progress)` in the background, False if a job with this name is running"""
+        if name in self.running:
+            return False
+        status = await TELEGRAM_SENDER.send_message(chat_id, f"{title}\n⏳ جاري التحضير...", priority=PRIORITY_ADMIN)
+        self.running[name] = asyncio.create_task(self._run(name, chat_id, status.message_id, title, action))
+        return True
+    
+    async def _run(self, name: str, chat_id: int, message_id: int, title: str, action: Callable[..., Awaitable]):
+        async def progress(text: str):
+            await TELEGRAM_SENDER.edit_message_text(chat_id, message_id, f"{title}\n{text}", priority=PRIORITY_PROGRESS)
+        
+        started = time.monotonic()
+        try:
+            result = await action(progress)
+            await report_progress(progress, result)
+            logger.info("Admin job %s finished in %.1fs", name, time.monotonic() - started)
+        except Exception as e:
+            logger.error("Admin job %s failed: %s", name, e)
+            await report_progress(progress, f"❌ فشل التنفيذ: {e}")
+        finally:
+            self.running.pop(name, None)
+    
+    async def close(self):
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-👇 اختر من القائمة:"""
-                        await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data == 'toggle_bot':
-                        BOT_SETTINGS['active'] = not BOT_SETTINGS['active']
-                        status_text = "تم تشغيل" if BOT_SETTINGS['active'] else "تم إيقاف"
-                        await query.answer(f"{status_text} البوت!")
-                        # Refresh main menu
-                        keyboard = [
-                            [InlineKeyboardButton("📺 التحكم بالقنوات", callback_data='channels_menu')],
-                            [InlineKeyboardButton("📊 الإحصائيات", callback_data='stats'),
-                             InlineKeyboardButton("🧪 اختبار فوري", callback_data='test')],
-                            [InlineKeyboardButton("🔴 إيقاف البوت" if BOT_SETTINGS['active'] else "🟢 تشغيل البوت", callback_data='toggle_bot')],
-                            [InlineKeyboardButton("🔄 مسح السجل", callback_data='reset_duplicates')]
-                        ]
-                        status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
-                        message = f"""🎛️ **لوحة التحكم الرئيسية**
+ADMIN_JOBS = AdminJobs()
+
+async def run_test_cycle(progress: Callable[[str], Awaitable]) -> str:
+    """Admin test: one posting cycle for this worker's active channels"""
+    posted = await post_products_job(progress=progress)
+    result = f"✅ تم الاختبار! تم نشر {posted} منتج - تحقق من القنوات"
+    other_workers = [config['name'] for key, config in CHANNELS_CONFIG.items()
+                     if config.get('active', False) and not owns_channel(key)]
+    if other_workers:
+        result += f"\nℹ️ قنوات يديرها عامل آخر ولم تُختبر: {', '.join(other_workers)}"
+    return result
+
+async def run_channel_test(channel_key: str, progress: Callable[[str], Awaitable]) -> str:
+    """Admin test: one posting run for a single channel, even if it is disabled"""
+    posted = await run_channel(channel_key, force=True, progress=progress)
+    return f"✅ تم اختبار {CHANNELS_CONFIG[channel_key]['name']}! تم نشر {posted} منتج"
+
+# Admin panel views - rendered screens are memoized per settings version,
+# and edits that would not change a panel message are skipped
+PANEL_STATE_VERSION = 0
+PANEL_RENDER_CACHE_SIZE = 128
+PANEL_MESSAGE_HISTORY = 512  # panel messages whose last content is remembered
+
+class PanelView:
+    """Rendered admin screen: Markdown text, keyboard and content hash"""
+    __slots__ = ('text', 'markup', 'digest')
+    
+    def __init__(self, text: str, markup: Optional[InlineKeyboardMarkup] = None):
+        self.text = text
+        self.markup = markup
+        payload = text + (json.dumps(markup.to_dict(), sort_keys=True) if markup else '')
+        self.digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest()
+
+def bump_panel_state():
+    """Invalidate rendered admin screens after a settings change"""
+    global PANEL_STATE_VERSION
+    PANEL_STATE_VERSION += 1
+
+def _main_menu_screen(posted_count: int):
+    """Main menu text and keyboard"""
+    keyboard = [
+        [InlineKeyboardButton("📺 التحكم بالقنوات", callback_data='channels_menu')],
+        [InlineKeyboardButton("📊 الإحصائيات", callback_data='stats'),
+         InlineKeyboardButton("🧪 اختبار فوري", callback_data='test')],
+        [InlineKeyboardButton("🔴 إيقاف البوت" if BOT_SETTINGS['active'] else "🟢 تشغيل البوت", callback_data='toggle_bot')],
+        [InlineKeyboardButton("🔄 مسح السجل", callback_data='reset_duplicates')]
+    ]
+    status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
+    message = f"""🎛️ **لوحة التحكم الرئيسية**
 
 📊 **الحالة:** {status}
-📦 **منتجات منشورة:** {len(POSTED_PRODUCTS)}
+📦 **منتجات منشورة:** {posted_count}
 
 👇 اختر من القائمة:"""
-                        await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data == 'test':
-                        await query.answer("🧪 جاري اختبار...")
-                        await post_products_job()
-                        await bot.send_message(chat_id, "✅ تم الاختبار! تحقق من القنوات")
-                    
-                    elif callback_data == 'reset_duplicates':
-                        count = len(POSTED_PRODUCTS)
-                        POSTED_PRODUCTS.clear()
-                        await query.answer(f"تم مسح {count} منتج")
-                        await bot.send_message(chat_id, f"✅ تم مسح سجل {count} منتج")
-                    
-                    elif callback_data == 'stats':
-                        status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
-                        active_channels = sum(1 for c in CHANNELS_CONFIG.values() if c.get('active', False))
-                        total_keywords = sum(len(c.get('keywords', [])) for c in CHANNELS_CONFIG.values())
-                        
-                        message = f"""📊 **إحصائيات البوت**
+    return message, keyboard
 
-🔹 **الحالة العامة:** {status}
-🔹 **القنوات النشطة:** {active_channels}/6
-🔹 **منتجات منشورة:** {len(POSTED_PRODUCTS)}
-🔹 **إجمالي الكلمات:** {total_keywords}
+def _channels_menu_screen():
+    """Channel list text and keyboard"""
+    message = "📺 **التحكم بالقنوات**\n\nاختر قناة للتحكم بها:"
+    keyboard = []
+    for key, config in CHANNELS_CONFIG.items():
+        emoji = "✅" if config.get('active', False) else "❌"
+        keyboard.append([InlineKeyboardButton(f"{emoji} {config['name']}", callback_data=f'channel_{key}')])
+    keyboard.append([InlineKeyboardButton("🔙 القائمة الرئيسية", callback_data='main_menu')])
+    return message, keyboard
 
-📺 **تفاصيل القنوات:**"""
-                        
-                        for key, config in CHANNELS_CONFIG.items():
-                            emoji = "✅" if config.get('active', False) else "❌"
-                            message += f"\n{emoji} {config['name']}: {config['posting_interval']}دق"
-                        
-                        keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data='main_menu')]]
-                        await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data == 'channels_menu':
-                        message = "📺 **التحكم بالقنوات**\n\nاختر قناة للتحكم بها:"
-                        keyboard = []
-                        for key, config in CHANNELS_CONFIG.items():
-                            emoji = "✅" if config.get('active', False) else "❌"
-                            keyboard.append([InlineKeyboardButton(f"{emoji} {config['name']}", callback_data=f'channel_{key}')])
-                        keyboard.append([InlineKeyboardButton("🔙 القائمة الرئيسية", callback_data='main_menu')])
-                        await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    # Channel-specific controls
-                    elif callback_data.startswith('channel_'):
-                        channel_key = callback_data.replace('channel_', '')
-                        if channel_key in CHANNELS_CONFIG:
-                            config = CHANNELS_CONFIG[channel_key]
-                            active = config.get('active', False)
-                            
-                            message = f"""⚙️ **{config['name']}**
+def _channel_screen(channel_key: str):
+    """Settings page of one channel"""
+    config = CHANNELS_CONFIG[channel_key]
+    active = config.get('active', False)
+    
+    message = f"""⚙️ **{config['name']}**
 
 📊 **الإعدادات الحالية:**
 • الحالة: {'✅ نشط' if active else '❌ متوقف'}
@@ -948,211 +2760,292 @@ async def handle_admin_commands():
 • كلمات مفتاحية: {len(config.get('keywords', []))}
 
 👇 اختر إجراء:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("🔴 تعطيل" if active else "🟢 تفعيل", callback_data=f'toggle_{channel_key}')],
-                                [InlineKeyboardButton("⏱️ تغيير الوقت", callback_data=f'time_{channel_key}'),
-                                 InlineKeyboardButton("🧪 اختبار", callback_data=f'test_{channel_key}')],
-                            ]
-                            # Add price control for channels except under5 and under10
-                            if channel_key not in ['under5', 'under10']:
-                                keyboard.append([InlineKeyboardButton("💰 تغيير السعر", callback_data=f'price_{channel_key}')])
-                            keyboard.extend([
-                                [InlineKeyboardButton("📊 معلومات الفلاتر", callback_data=f'filters_{channel_key}')],
-                                [InlineKeyboardButton("🔙 قائمة القنوات", callback_data='channels_menu')]
-                            ])
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('toggle_'):
-                        channel_key = callback_data.replace('toggle_', '')
-                        if channel_key in CHANNELS_CONFIG:
-                            CHANNELS_CONFIG[channel_key]['active'] = not CHANNELS_CONFIG[channel_key].get('active', False)
-                            status = "تم تفعيل" if CHANNELS_CONFIG[channel_key]['active'] else "تم تعطيل"
-                            await query.answer(f"{status} القناة!")
-                            
-                            # Refresh channel page
-                            config = CHANNELS_CONFIG[channel_key]
-                            active = config.get('active', False)
-                            message = f"""⚙️ **{config['name']}**
-
-📊 **الإعدادات الحالية:**
-• الحالة: {'✅ نشط' if active else '❌ متوقف'}
-• معرف القناة: `{config['channel_id']}`
-• التوقيت: كل {config['posting_interval']} دقيقة
-• السعر: ${config['min_price']} - ${config['max_price']}
-• العمولة: {config['min_commission']}%+
-• كلمات مفتاحية: {len(config.get('keywords', []))}
+    
+    keyboard = [
+        [InlineKeyboardButton("🔴 تعطيل" if active else "🟢 تفعيل", callback_data=f'toggle_{channel_key}')],
+        [InlineKeyboardButton("⏱️ تغيير الوقت", callback_data=f'time_{channel_key}'),
+         InlineKeyboardButton("🧪 اختبار", callback_data=f'test_{channel_key}')],
+    ]
+    # Add price control for channels except under5 and under10
+    if channel_key not in ['under5', 'under10']:
+        keyboard.append([InlineKeyboardButton("💰 تغيير السعر", callback_data=f'price_{channel_key}')])
+    keyboard.extend([
+        [InlineKeyboardButton("📊 معلومات الفلاتر", callback_data=f'filters_{channel_key}')],
+        [InlineKeyboardButton("🔙 قائمة القنوات", callback_data='channels_menu')]
+    ])
+    return message, keyboard
 
-👇 اختر إجراء:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("🔴 تعطيل" if active else "🟢 تفعيل", callback_data=f'toggle_{channel_key}')],
-                                [InlineKeyboardButton("⏱️ تغيير الوقت", callback_data=f'time_{channel_key}'),
-                                 InlineKeyboardButton("🧪 اختبار", callback_data=f'test_{channel_key}')],
-                            ]
-                            # Add price control for channels except under5 and under10
-                            if channel_key not in ['under5', 'under10']:
-                                keyboard.append([InlineKeyboardButton("💰 تغيير السعر", callback_data=f'price_{channel_key}')])
-                            keyboard.extend([
-                                [InlineKeyboardButton("📊 معلومات الفلاتر", callback_data=f'filters_{channel_key}')],
-                                [InlineKeyboardButton("🔙 قائمة القنوات", callback_data='channels_menu')]
-                            ])
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('time_'):
-                        channel_key = callback_data.replace('time_', '')
-                        if channel_key in CHANNELS_CONFIG:
-                            config = CHANNELS_CONFIG[channel_key]
-                            current = config['posting_interval']
-                            
-                            message = f"""⏱️ **تغيير توقيت {config['name']}**
+def _time_screen(channel_key: str):
+    """Posting interval picker of one channel"""
+    config = CHANNELS_CONFIG[channel_key]
+    current = config['posting_interval']
+    
+    message = f"""⏱️ **تغيير توقيت {config['name']}**
 
 ⏰ **التوقيت الحالي:** {current} دقيقة
 
 👇 اختر توقيت جديد:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("60 دقيقة (1 ساعة)", callback_data=f'settime_{channel_key}_60'),
-                                 InlineKeyboardButton("90 دقيقة (1.5 ساعة)", callback_data=f'settime_{channel_key}_90')],
-                                [InlineKeyboardButton("120 دقيقة (2 ساعة)", callback_data=f'settime_{channel_key}_120'),
-                                 InlineKeyboardButton("150 دقيقة (2.5 ساعة)", callback_data=f'settime_{channel_key}_150')],
-                                [InlineKeyboardButton("180 دقيقة (3 ساعات)", callback_data=f'settime_{channel_key}_180'),
-                                 InlineKeyboardButton("210 دقيقة (3.5 ساعة)", callback_data=f'settime_{channel_key}_210')],
-                                [InlineKeyboardButton("240 دقيقة (4 ساعات)", callback_data=f'settime_{channel_key}_240'),
-                                 InlineKeyboardButton("300 دقيقة (5 ساعات)", callback_data=f'settime_{channel_key}_300')],
-                                [InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]
-                            ]
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('settime_'):
-                        parts = callback_data.split('_')
-                        channel_key = parts[1]
-                        new_time = int(parts[2])
-                        if channel_key in CHANNELS_CONFIG:
-                            CHANNELS_CONFIG[channel_key]['posting_interval'] = new_time
-                            await query.answer(f"✅ تم تغيير التوقيت إلى {new_time} دقيقة")
-                            
-                            # Back to channel page
-                            config = CHANNELS_CONFIG[channel_key]
-                            active = config.get('active', False)
-                            message = f"""⚙️ **{config['name']}**
-
-📊 **الإعدادات الحالية:**
-• الحالة: {'✅ نشط' if active else '❌ متوقف'}
-• معرف القناة: `{config['channel_id']}`
-• التوقيت: كل {config['posting_interval']} دقيقة
-• السعر: ${config['min_price']} - ${config['max_price']}
-• العمولة: {config['min_commission']}%+
-• كلمات مفتاحية: {len(config.get('keywords', []))}
+    
+    keyboard = [
+        [InlineKeyboardButton("60 دقيقة (1 ساعة)", callback_data=f'settime_{channel_key}_60'),
+         InlineKeyboardButton("90 دقيقة (1.5 ساعة)", callback_data=f'settime_{channel_key}_90')],
+        [InlineKeyboardButton("120 دقيقة (2 ساعة)", callback_data=f'settime_{channel_key}_120'),
+         InlineKeyboardButton("150 دقيقة (2.5 ساعة)", callback_data=f'settime_{channel_key}_150')],
+        [InlineKeyboardButton("180 دقيقة (3 ساعات)", callback_data=f'settime_{channel_key}_180'),
+         InlineKeyboardButton("210 دقيقة (3.5 ساعة)", callback_data=f'settime_{channel_key}_210')],
+        [InlineKeyboardButton("240 دقيقة (4 ساعات)", callback_data=f'settime_{channel_key}_240'),
+         InlineKeyboardButton("300 دقيقة (5 ساعات)", callback_data=f'settime_{channel_key}_300')],
+        [InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]
+    ]
+    return message, keyboard
 
-👇 اختر إجراء:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("🔴 تعطيل" if active else "🟢 تفعيل", callback_data=f'toggle_{channel_key}')],
-                                [InlineKeyboardButton("⏱️ تغيير الوقت", callback_data=f'time_{channel_key}'),
-                                 InlineKeyboardButton("🧪 اختبار", callback_data=f'test_{channel_key}')],
-                            ]
-                            # Add price control for channels except under5 and under10
-                            if channel_key not in ['under5', 'under10']:
-                                keyboard.append([InlineKeyboardButton("💰 تغيير السعر", callback_data=f'price_{channel_key}')])
-                            keyboard.extend([
-                                [InlineKeyboardButton("📊 معلومات الفلاتر", callback_data=f'filters_{channel_key}')],
-                                [InlineKeyboardButton("🔙 قائمة القنوات", callback_data='channels_menu')]
-                            ])
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('test_'):
-                        channel_key = callback_data.replace('test_', '')
-                        await query.answer(f"🧪 جاري اختبار {CHANNELS_CONFIG[channel_key]['name']}...")
-                        # Test this specific channel
-                        if channel_key in CHANNELS_CONFIG:
-                            original_active = CHANNELS_CONFIG[channel_key]['active']
-                            CHANNELS_CONFIG[channel_key]['active'] = True
-                            await post_products_job()
-                            CHANNELS_CONFIG[channel_key]['active'] = original_active
-                            await bot.send_message(chat_id, f"✅ تم اختبار {CHANNELS_CONFIG[channel_key]['name']}!")
-                    
-                    elif callback_data.startswith('price_'):
-                        channel_key = callback_data.replace('price_', '')
-                        if channel_key in CHANNELS_CONFIG and channel_key not in ['under5', 'under10']:
-                            config = CHANNELS_CONFIG[channel_key]
-                            current_min = config['min_price']
-                            current_max = config['max_price']
-                            
-                            message = f"""💰 **تغيير نطاق السعر لـ {config['name']}**
+def _price_screen(channel_key: str):
+    """Price range picker of one channel"""
+    config = CHANNELS_CONFIG[channel_key]
+    current_min = config['min_price']
+    current_max = config['max_price']
+    
+    message = f"""💰 **تغيير نطاق السعر لـ {config['name']}**
 
 💵 **النطاق الحالي:** ${current_min} - ${current_max}
 
 👇 اختر نطاق سعر جديد:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("$0 - $20", callback_data=f'setprice_{channel_key}_0_20'),
-                                 InlineKeyboardButton("$0 - $50", callback_data=f'setprice_{channel_key}_0_50')],
-                                [InlineKeyboardButton("$0 - $100", callback_data=f'setprice_{channel_key}_0_100'),
-                                 InlineKeyboardButton("$0 - $150", callback_data=f'setprice_{channel_key}_0_150')],
-                                [InlineKeyboardButton("$0 - $200", callback_data=f'setprice_{channel_key}_0_200'),
-                                 InlineKeyboardButton("$0 - $300", callback_data=f'setprice_{channel_key}_0_300')],
-                                [InlineKeyboardButton("$0 - $400", callback_data=f'setprice_{channel_key}_0_400'),
-                                 InlineKeyboardButton("$0 - $500", callback_data=f'setprice_{channel_key}_0_500')],
-                                [InlineKeyboardButton("$5 - $100", callback_data=f'setprice_{channel_key}_5_100'),
-                                 InlineKeyboardButton("$10 - $200", callback_data=f'setprice_{channel_key}_10_200')],
-                                [InlineKeyboardButton("$20 - $300", callback_data=f'setprice_{channel_key}_20_300'),
-                                 InlineKeyboardButton("$50 - $500", callback_data=f'setprice_{channel_key}_50_500')],
-                                [InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]
-                            ]
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('setprice_'):
-                        # Remove 'setprice_' prefix and split from the end to get prices
-                        data = callback_data.replace('setprice_', '')
-                        parts = data.rsplit('_', 2)  # Split from right to get last 2 parts (min, max)
-                        channel_key = parts[0]
-                        min_price = int(parts[1])
-                        max_price = int(parts[2])
-                        if channel_key in CHANNELS_CONFIG and channel_key not in ['under5', 'under10']:
-                            CHANNELS_CONFIG[channel_key]['min_price'] = min_price
-                            CHANNELS_CONFIG[channel_key]['max_price'] = max_price
-                            await query.answer(f"✅ تم تغيير السعر إلى ${min_price}-${max_price}")
-                            
-                            # Back to channel page
-                            config = CHANNELS_CONFIG[channel_key]
-                            active = config.get('active', False)
-                            message = f"""⚙️ **{config['name']}**
+    
+    keyboard = [
+        [InlineKeyboardButton("$0 - $20", callback_data=f'setprice_{channel_key}_0_20'),
+         InlineKeyboardButton("$0 - $50", callback_data=f'setprice_{channel_key}_0_50')],
+        [InlineKeyboardButton("$0 - $100", callback_data=f'setprice_{channel_key}_0_100'),
+         InlineKeyboardButton("$0 - $150", callback_data=f'setprice_{channel_key}_0_150')],
+        [InlineKeyboardButton("$0 - $200", callback_data=f'setprice_{channel_key}_0_200'),
+         InlineKeyboardButton("$0 - $300", callback_data=f'setprice_{channel_key}_0_300')],
+        [InlineKeyboardButton("$0 - $400", callback_data=f'setprice_{channel_key}_0_400'),
+         InlineKeyboardButton("$0 - $500", callback_data=f'setprice_{channel_key}_0_500')],
+        [InlineKeyboardButton("$5 - $100", callback_data=f'setprice_{channel_key}_5_100'),
+         InlineKeyboardButton("$10 - $200", callback_data=f'setprice_{channel_key}_10_200')],
+        [InlineKeyboardButton("$20 - $300", callback_data=f'setprice_{channel_key}_20_300'),
+         InlineKeyboardButton("$50 - $500", callback_data=f'setprice_{channel_key}_50_500')],
+        [InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]
+    ]
+    return message, keyboard
 
-📊 **الإعدادات الحالية:**
-• الحالة: {'✅ نشط' if active else '❌ متوقف'}
-• معرف القناة: `{config['channel_id']}`
-• التوقيت: كل {config['posting_interval']} دقيقة
-• السعر: ${config['min_price']} - ${config['max_price']}
-• العمولة: {config['min_commission']}%+
-• كلمات مفتاحية: {len(config.get('keywords', []))}
+PANEL_SCREENS = {
+    'main_menu': _main_menu_screen,
+    'channels_menu': _channels_menu_screen,
+    'channel': _channel_screen,
+    'time': _time_screen,
+    'price': _price_screen,
+}
 
-👇 اختر إجراء:"""
-                            
-                            keyboard = [
-                                [InlineKeyboardButton("🔴 تعطيل" if active else "🟢 تفعيل", callback_data=f'toggle_{channel_key}')],
-                                [InlineKeyboardButton("⏱️ تغيير الوقت", callback_data=f'time_{channel_key}'),
-                                 InlineKeyboardButton("🧪 اختبار", callback_data=f'test_{channel_key}')],
-                            ]
-                            # Add price control for channels except under5 and under10
-                            if channel_key not in ['under5', 'under10']:
-                                keyboard.append([InlineKeyboardButton("💰 تغيير السعر", callback_data=f'price_{channel_key}')])
-                            keyboard.extend([
-                                [InlineKeyboardButton("📊 معلومات الفلاتر", callback_data=f'filters_{channel_key}')],
-                                [InlineKeyboardButton("🔙 قائمة القنوات", callback_data='channels_menu')]
-                            ])
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
-                    
-                    elif callback_data.startswith('filters_'):
-                        channel_key = callback_data.replace('filters_', '')
-                        if channel_key in CHANNELS_CONFIG:
-                            config = CHANNELS_CONFIG[channel_key]
-                            keywords = config.get('keywords', [])
-                            exclude = config.get('exclude_keywords', [])
-                            keywords_preview = ', '.join(keywords[:10]) + ('...' if len(keywords) > 10 else '') if keywords else 'لا يوجد'
-                            exclude_preview = ', '.join(exclude) if exclude else 'لا يوجد'
-                            
-                            message = f"""🎯 **فلاتر {config['name']}**
+@lru_cache(maxsize=PANEL_RENDER_CACHE_SIZE)
+def _render_screen(screen: str, channel_key: Optional[str], version: int, posted_count: int) -> PanelView:
+    if screen == 'main_menu':
+        message, keyboard = _main_menu_screen(posted_count)
+    elif channel_key is None:
+        message, keyboard = PANEL_SCREENS[screen]()
+    else:
+        message, keyboard = PANEL_SCREENS[screen](channel_key)
+    return PanelView(message, InlineKeyboardMarkup(keyboard))
+
+def render_screen(screen: str, channel_key: Optional[str] = None) -> PanelView:
+    """Rendered admin screen, reused until the settings (or the posted count on the main menu) change"""
+    posted_count = len(POSTED_PRODUCTS) if screen == 'main_menu' else 0
+    return _render_screen(screen, channel_key, PANEL_STATE_VERSION, posted_count)
+
+class PanelMessages:
+    """Sends admin panel screens and skips edits that would leave a message unchanged"""
+    
+    def __init__(self, max_size: int = PANEL_MESSAGE_HISTORY):
+        self.max_size = max_size
+        self.digests = OrderedDict()  # (chat_id, message_id) -> digest of the shown content
+        self.edits = 0
+        self.skipped = 0
+    
+    def _remember(self, chat_id: int, message_id: int, digest: bytes):
+        key = (chat_id, message_id)
+        self.digests[key] = digest
+        self.digests.move_to_end(key)
+        while len(self.digests) > self.max_size:
+            self.digests.popitem(last=False)
+    
+    async def send(self, chat_id: int, view: PanelView):
+        message = await TELEGRAM_SENDER.send_message(chat_id, view.text, parse_mode='Markdown',
+                                                     reply_markup=view.markup, priority=PRIORITY_ADMIN)
+        self._remember(chat_id, message.message_id, view.digest)
+        return message
+    
+    async def edit(self, chat_id: int, message_id: int, view: PanelView) -> bool:
+        """Show `view` in a panel message, False when it already shows exactly that"""
+        if self.digests.get((chat_id, message_id)) == view.digest:
+            self.skipped += 1
+            return False
+        try:
+            await TELEGRAM_SENDER.edit_message_text(chat_id, message_id, view.text, parse_mode='Markdown',
+                                                    reply_markup=view.markup)
+        except BadRequest as e:
+            if "Message is not modified" not in str(e):
+                self.digests.pop((chat_id, message_id), None)
+                raise
+            self._remember(chat_id, message_id, view.digest)
+            self.skipped += 1
+            return False
+        self._remember(chat_id, message_id, view.digest)
+        self.edits += 1
+        return True
+
+PANEL_MESSAGES = PanelMessages()
+
+async def handle_update(update):
+    """Handle one admin update (inline keyboard control panel and commands)"""
+    # Handle callback queries (button clicks)
+    if update.callback_query:
+        query = update.callback_query
+        if query.from_user.id not in ADMIN_USER_IDS:
+            return
+        
+        callback_data = query.data
+        chat_id = query.message.chat_id
+        message_id = query.message.message_id
+        
+        # Global controls
+        if callback_data == 'main_menu':
+            await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('main_menu'))
+        
+        elif callback_data == 'toggle_bot':
+            BOT_SETTINGS['active'] = not BOT_SETTINGS['active']
+            bump_panel_state()
+            status_text = "تم تشغيل" if BOT_SETTINGS['active'] else "تم إيقاف"
+            await query.answer(f"{status_text} البوت!")
+            # Refresh main menu
+            await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('main_menu'))
+        
+        elif callback_data == 'test':
+            # Runs in the background - the panel stays responsive while posting
+            if ADMIN_JOBS.is_running('test'):
+                await query.answer("⏳ الاختبار قيد التشغيل بالفعل")
+            else:
+                await query.answer("🧪 جاري اختبار...")
+                await ADMIN_JOBS.start('test', chat_id, "🧪 اختبار فوري", run_test_cycle)
+        
+        elif callback_data == 'reset_duplicates':
+            count = len(POSTED_PRODUCTS)
+            POSTED_PRODUCTS.clear()
+            await query.answer(f"تم مسح {count} منتج")
+            await TELEGRAM_SENDER.send_message(chat_id, f"✅ تم مسح سجل {count} منتج", priority=PRIORITY_ADMIN)
+        
+        elif callback_data == 'stats':
+            status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
+            active_channels = sum(1 for c in CHANNELS_CONFIG.values() if c.get('active', False))
+            total_keywords = sum(len(c.get('keywords', [])) for c in CHANNELS_CONFIG.values())
+            cache_stats = API_RESPONSE_CACHE.stats()
+            
+            message = f"""📊 **إحصائيات البوت**
+
+🔹 **الحالة العامة:** {status}
+🔹 **القنوات النشطة:** {active_channels}/{len(CHANNELS_CONFIG)}
+🔹 **منتجات منشورة:** {len(POSTED_PRODUCTS)}
+🔹 **إجمالي الكلمات:** {total_keywords}
+
+💾 **كاش AliExpress:**
+• طلبات موفرة: {cache_stats['hits'] + cache_stats['coalesced']} ({cache_stats['hits']} كاش + {cache_stats['coalesced']} مدمج)
+• طلبات فعلية: {cache_stats['misses']}
+• عناصر محفوظة: {cache_stats['entries']}
+• صور محفوظة (file_id): {len(PHOTO_CACHE)}
+
+{metrics_summary()}
+
+🔌 **اتصال AliExpress:**
+{breaker_summary()}
+
+📺 **تفاصيل القنوات:**"""
+            
+            for key, config in CHANNELS_CONFIG.items():
+                emoji = "✅" if config.get('active', False) else "❌"
+                message += f"\n{emoji} {config['name']}: {config['posting_interval']}دق"
+            
+            keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data='main_menu')]]
+            await PANEL_MESSAGES.edit(chat_id, message_id, PanelView(message, InlineKeyboardMarkup(keyboard)))
+        
+        elif callback_data == 'channels_menu':
+            await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('channels_menu'))
+        
+        # Channel-specific controls
+        elif callback_data.startswith('channel_'):
+            channel_key = callback_data.replace('channel_', '')
+            if channel_key in CHANNELS_CONFIG:
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('channel', channel_key))
+        
+        elif callback_data.startswith('toggle_'):
+            channel_key = callback_data.replace('toggle_', '')
+            if channel_key in CHANNELS_CONFIG:
+                CHANNEL_STORE.update(channel_key, active=not CHANNELS_CONFIG[channel_key].get('active', False))
+                status = "تم تفعيل" if CHANNELS_CONFIG[channel_key]['active'] else "تم تعطيل"
+                await query.answer(f"{status} القناة!")
+                
+                # Refresh channel page
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('channel', channel_key))
+        
+        elif callback_data.startswith('time_'):
+            channel_key = callback_data.replace('time_', '')
+            if channel_key in CHANNELS_CONFIG:
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('time', channel_key))
+        
+        elif callback_data.startswith('settime_'):
+            # Split from the right - channel keys may contain underscores (hot_deals)
+            channel_key, new_time = callback_data.replace('settime_', '').rsplit('_', 1)
+            new_time = int(new_time)
+            if channel_key in CHANNELS_CONFIG:
+                CHANNEL_STORE.update(channel_key, posting_interval=new_time)
+                if owns_channel(channel_key):
+                    schedule_channel(channel_key)  # other workers reschedule when they reload the channels file
+                await query.answer(f"✅ تم تغيير التوقيت إلى {new_time} دقيقة")
+                
+                # Back to channel page
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('channel', channel_key))
+        
+        elif callback_data.startswith('test_'):
+            channel_key = callback_data.replace('test_', '')
+            # Test this specific channel in the background
+            if channel_key in CHANNELS_CONFIG:
+                job_name = f'test_{channel_key}'
+                if not owns_channel(channel_key):
+                    # Posting here would bypass the owner's run lock and overlap its cycles
+                    await query.answer("⚠️ هذه القناة يديرها عامل آخر - اختبرها من هناك", show_alert=True)
+                elif ADMIN_JOBS.is_running(job_name):
+                    await query.answer("⏳ الاختبار قيد التشغيل بالفعل")
+                else:
+                    await query.answer(f"🧪 جاري اختبار {CHANNELS_CONFIG[channel_key]['name']}...")
+                    await ADMIN_JOBS.start(job_name, chat_id, f"🧪 اختبار {CHANNELS_CONFIG[channel_key]['name']}",
+                                           lambda progress: run_channel_test(channel_key, progress))
+        
+        elif callback_data.startswith('price_'):
+            channel_key = callback_data.replace('price_', '')
+            if channel_key in CHANNELS_CONFIG and channel_key not in ['under5', 'under10']:
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('price', channel_key))
+        
+        elif callback_data.startswith('setprice_'):
+            # Remove 'setprice_' prefix and split from the end to get prices
+            data = callback_data.replace('setprice_', '')
+            parts = data.rsplit('_', 2)  # Split from right to get last 2 parts (min, max)
+            channel_key = parts[0]
+            min_price = int(parts[1])
+            max_price = int(parts[2])
+            if channel_key in CHANNELS_CONFIG and channel_key not in ['under5', 'under10']:
+                CHANNEL_STORE.update(channel_key, min_price=min_price, max_price=max_price)
+                await query.answer(f"✅ تم تغيير السعر إلى ${min_price}-${max_price}")
+                
+                # Back to channel page
+                await PANEL_MESSAGES.edit(chat_id, message_id, render_screen('channel', channel_key))
+        
+        elif callback_data.startswith('filters_'):
+            channel_key = callback_data.replace('filters_', '')
+            if channel_key in CHANNELS_CONFIG:
+                config = CHANNELS_CONFIG[channel_key]
+                keywords = config.get('keywords', [])
+                exclude = config.get('exclude_keywords', [])
+                keywords_preview = ', '.join(keywords[:10]) + ('...' if len(keywords) > 10 else '') if keywords else 'لا يوجد'
+                exclude_preview = ', '.join(exclude) if exclude else 'لا يوجد'
+                
+                message = f"""🎯 **فلاتر {config['name']}**
 
 💰 **السعر:**
 • الحد الأدنى: ${config['min_price']}
@@ -1161,86 +3054,363 @@ async def handle_admin_commands():
 💵 **العمولة:**
 • الحد الأدنى: {config['min_commission']}%
 
+🏷️ **الجودة:**
+• الخصم الأدنى: {config.get('min_discount', 0)}%
+• التقييم الأدنى: {config.get('min_rating', 0)}%
+• المبيعات الدنيا: {config.get('min_volume', 0)}
+
 🔑 **الكلمات المفتاحية:**
 • العدد: {len(keywords)}
 • أمثلة: {keywords_preview}
 
 🚫 **كلمات الاستبعاد:**
 • {exclude_preview}"""
-                            
-                            keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]]
-                            await bot.edit_message_text(message, chat_id, message_id, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
                 
-                # Handle text messages
-                if update.message and update.message.from_user.id in ADMIN_USER_IDS:
-                    text = update.message.text
-                    chat_id = update.message.chat_id
-                    
-                    if text == '/start' or text == '/menu':
-                        keyboard = [
-                            [InlineKeyboardButton("📺 التحكم بالقنوات", callback_data='channels_menu')],
-                            [InlineKeyboardButton("📊 الإحصائيات", callback_data='stats'),
-                             InlineKeyboardButton("🧪 اختبار فوري", callback_data='test')],
-                            [InlineKeyboardButton("🔴 إيقاف البوت" if BOT_SETTINGS['active'] else "🟢 تشغيل البوت", callback_data='toggle_bot')],
-                            [InlineKeyboardButton("🔄 مسح السجل", callback_data='reset_duplicates')]
-                        ]
-                        status = "🟢 يعمل" if BOT_SETTINGS['active'] else "🔴 متوقف"
-                        message = f"""🎛️ **لوحة التحكم الرئيسية**
-
-📊 **الحالة:** {status}
-📦 **منتجات منشورة:** {len(POSTED_PRODUCTS)}
+                stats = FILTER_STATS.get(channel_key)
+                if stats and stats['seen']:
+                    message += f"\n\n📉 **نتائج الفلترة:**\n• المقبول: {stats['accepted']} من {stats['seen']}"
+                    for reason, count in stats.most_common():
+                        if reason in FILTER_REASON_LABELS:
+                            message += f"\n• {FILTER_REASON_LABELS[reason]}: {count}"
+                
+                top_keywords = KEYWORD_STATS.top(channel_key)
+                if top_keywords:
+                    message += "\n\n🏆 **أفضل الكلمات:**"
+                    for keyword, score, queries, posted in top_keywords:
+                        message += f"\n• {keyword}: {score:.1f} منتج/طلب ({posted:g} منشور)"
+                
+                keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data=f'channel_{channel_key}')]]
+                await PANEL_MESSAGES.edit(chat_id, message_id, PanelView(message, InlineKeyboardMarkup(keyboard)))
+    
+    # Handle text messages
+    if update.message and update.message.from_user.id in ADMIN_USER_IDS:
+        text = update.message.text
+        chat_id = update.message.chat_id
+        
+        if text == '/start' or text == '/menu':
+            await PANEL_MESSAGES.send(chat_id, render_screen('main_menu'))
 
-👇 اختر من القائمة:"""
-                        await bot.send_message(chat_id, message, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
+async def handle_admin_commands():
+    """Poll admin updates and hand them to the dispatcher"""
+    bot = TELEGRAM_SENDER.bot
+    last_update_id = 0
+    
+    while True:
+        try:
+            updates = await bot.get_updates(offset=last_update_id + 1, timeout=5)
+            
+            for update in updates:
+                last_update_id = update.update_id
+                ADMIN_DISPATCHER.dispatch(update)
+        
+        except Conflict as e:
+            # A webhook registered meanwhile (e.g. by another run) blocks get_updates
+            logger.warning("Polling conflict, removing webhook again: %s", e)
+            try:
+                await bot.delete_webhook()
+            except Exception as e:
+                logger.warning("Could not remove webhook: %s", e)
+            await asyncio.sleep(1)
         
         except Exception as e:
-            # Ignore "message not modified" errors - they're not critical
-            if "Message is not modified" not in str(e):
-                logger.error(f"Error handling admin commands: {e}")
+            logger.error("Error polling admin updates: %s", e)
             await asyncio.sleep(1)
 
-async def periodic_poster():
-    """Run periodic product posting with randomized intervals"""
-    # Random initial wait (20-60 seconds) - more natural
-    initial_wait = random.randint(20, 60)
-    logger.info(f"Waiting {initial_wait} seconds before first post...")
-    await asyncio.sleep(initial_wait)
+ADMIN_DISPATCHER = AdminDispatcher(handle_update)
+
+HTTP_IDLE_TIMEOUT = 30  # seconds a keep-alive connection may stay idle
+HTTP_MAX_BODY = 1024 * 1024  # bytes
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class HTTPReceiver:
+    """Minimal asyncio HTTP/1.1 server for the webhook and other small local endpoints"""
+    
+    def __init__(self, host: str, port: int, routes: Dict[str, Callable[..., Awaitable]]):
+        # routes: path -> async handler(method, headers, body) returning (status, body, content_type)
+        self.host = host
+        self.port = port
+        self.routes = routes
+        self.server = None
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info("HTTP receiver listening on %s:%s (%s)", self.host, self.port, ', '.join(self.routes))
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HTTP_IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    return
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                
+                try:
+                    length = int(headers.get('content-length', '0') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # Without a usable length the body cannot be framed - answer and drop the connection
+                    await self._respond(writer, 400, b'', 'text/plain', keep_alive=False)
+                    return
+                if length > HTTP_MAX_BODY:
+                    await self._respond(writer, 413, b'', 'text/plain', keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+                
+                handler = self.routes.get(target.split('?', 1)[0])
+                if handler is None:
+                    status, payload, content_type = 404, b'', 'text/plain'
+                else:
+                    try:
+                        status, payload, content_type = await handler(method, headers, body)
+                    except Exception as e:
+                        logger.error("HTTP handler for %s failed: %s", target, e)
+                        status, payload, content_type = 500, b'', 'text/plain'
+                
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                await self._respond(writer, status, payload, content_type, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: bytes, content_type: str, keep_alive: bool):
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+    
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+async def handle_webhook_request(method: str, headers: Dict[str, str], body: bytes):
+    """Telegram webhook endpoint - validates the secret token and dispatches the update"""
+    if method != 'POST':
+        return 405, b'', 'text/plain'
+    if not hmac.compare_digest(headers.get('x-telegram-bot-api-secret-token', ''), WEBHOOK_SECRET):
+        logger.warning("Rejected webhook request with a wrong secret token")
+        return 403, b'', 'text/plain'
+    try:
+        update = Update.de_json(json.loads(body), TELEGRAM_SENDER.bot)
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        logger.warning("Rejected malformed webhook update: %s", e)
+        return 400, b'', 'text/plain'
+    # Answer Telegram right away, the update is handled by the dispatcher
+    if update is not None:
+        ADMIN_DISPATCHER.dispatch(update)
+    return 200, b'', 'text/plain'
+
+def webhook_path() -> str:
+    """Local path the webhook is served on (the path part of WEBHOOK_URL)"""
+    return httpx.URL(WEBHOOK_URL).path or '/'
+
+async def start_webhook() -> HTTPReceiver:
+    """Start the local webhook receiver and register WEBHOOK_URL with Telegram"""
+    receiver = HTTPReceiver(WEBHOOK_LISTEN, WEBHOOK_PORT, {webhook_path(): handle_webhook_request})
+    await receiver.start()
+    if not WEBHOOK_REGISTER:
+        logger.info("Webhook receiver started on %s without registering it", webhook_path())
+        return receiver
+    try:
+        await TELEGRAM_SENDER.bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=['message', 'callback_query']
+        )
+    except Exception:
+        await receiver.close()
+        raise
+    logger.info("Webhook registered: %s", WEBHOOK_URL)
+    return receiver
+
+async def receive_admin_updates():
+    """Receive admin updates through the webhook when configured, long polling otherwise"""
+    if WEBHOOK_URL:
+        try:
+            receiver = await start_webhook()
+        except Exception as e:
+            logger.error("Webhook setup failed, falling back to long polling: %s", e)
+        else:
+            try:
+                await asyncio.Event().wait()  # updates arrive through the receiver
+            finally:
+                await receiver.close()
+    
+    # A webhook left over from an earlier run blocks get_updates
+    try:
+        await TELEGRAM_SENDER.bot.delete_webhook()
+    except Exception as e:
+        logger.warning("Could not remove webhook: %s", e)
+    await handle_admin_commands()
+
+class LeaderLock:
+    """Exclusive lock file - the worker holding it receives the admin updates (released when it exits)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    def acquire(self) -> bool:
+        """Try to become the leader without waiting"""
+        if self._file is not None or WORKER_COUNT == 1:
+            return True
+        if fcntl is None:
+            return WORKER_ID == 0  # no file locks on this platform - the first worker leads
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f'{os.getpid()} worker {WORKER_ID}\n')
+        lock_file.flush()
+        self._file = lock_file
+        return True
     
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing drops the lock
+            self._file = None
+
+# Admin updates are received by one worker only (two pollers would conflict)
+LEADER_LOCK = LeaderLock(f'{STATE_DB_PATH}.leader')
+
+async def lead_admin_updates():
+    """Receive admin updates once this worker is the leader - followers take over when the leader exits"""
+    while not LEADER_LOCK.acquire():
+        await asyncio.sleep(LEADER_RETRY_INTERVAL)
+    if WORKER_COUNT > 1:
+        logger.info("Worker %d is the admin leader", WORKER_ID)
+    await receive_admin_updates()
+
+# Shared scheduler - one interval job per channel
+scheduler = AsyncIOScheduler(timezone=pytz.utc)
+
+def channel_job_id(channel_key: str) -> str:
+    """Scheduler job id for a channel"""
+    return f'post_{channel_key}'
+
+async def post_channel_job(channel_key: str):
+    """Scheduled job: post products for a single channel"""
+    channel_config = CHANNELS_CONFIG.get(channel_key)
+    if not BOT_SETTINGS['active'] or not channel_config or not channel_config.get('active', False):
+        logger.info("Skipping scheduled run for %s (bot or channel inactive)", channel_key)
+        return
+    await run_channel(channel_key)
+
+def schedule_channel(channel_key: str, first_run_delay: Optional[int] = None):
+    """Add or reschedule the posting job of a channel using its own interval"""
+    interval = max(MIN_POSTING_INTERVAL, CHANNELS_CONFIG[channel_key]['posting_interval'])
+    trigger = IntervalTrigger(minutes=interval, jitter=SCHEDULE_JITTER, timezone=pytz.utc)
+    job_id = channel_job_id(channel_key)
+    
+    if scheduler.get_job(job_id):
+        # Live change from the admin panel - next run counts from now
+        job = scheduler.reschedule_job(job_id, trigger=trigger)
+    else:
+        if first_run_delay is None:
+            first_run_delay = random.randint(*FIRST_RUN_DELAY_RANGE)
+        job = scheduler.add_job(
+            post_channel_job,
+            trigger,
+            args=[channel_key],
+            id=job_id,
+            next_run_time=datetime.now(pytz.utc) + timedelta(seconds=first_run_delay),
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=SCHEDULE_JITTER
+        )
+    logger.info("Channel %s scheduled every %s min, next run at %s", channel_key, interval, job.next_run_time)
+
+def reschedule_changed_channels(previous: ChannelSnapshot):
+    """Bring the channel jobs in line with a reloaded channels file"""
+    for channel_key in previous.channels.keys() - CHANNELS_CONFIG.keys():
+        if scheduler.get_job(channel_job_id(channel_key)):
+            scheduler.remove_job(channel_job_id(channel_key))
+            logger.info("Channel %s removed from the schedule", channel_key)
+    for channel_key, config in CHANNELS_CONFIG.items():
+        old_config = previous.channels.get(channel_key)
+        if owns_channel(channel_key) and (old_config is None or old_config['posting_interval'] != config['posting_interval']):
+            schedule_channel(channel_key)
+
+async def watch_channels_file():
+    """Background loop - pick up edits of the channels file without a restart"""
     while True:
-        if BOT_SETTINGS['active']:
-            await post_products_job()
-        
-        # Get minimum interval and add randomization (±5 minutes)
-        min_interval = min([config['posting_interval'] for config in CHANNELS_CONFIG.values() if config.get('active', False)], default=30)
-        
-        # Add random variation: -5 to +5 minutes
-        random_variation = random.randint(-5, 5)
-        actual_interval = max(15, min_interval + random_variation)  # Never less than 15 minutes
-        
-        logger.info(f"Next post cycle in {actual_interval} minutes (base: {min_interval} min)")
-        await asyncio.sleep(actual_interval * 60)
+        await asyncio.sleep(CHANNELS_RELOAD_INTERVAL)
+        previous = CHANNEL_STORE.reload_if_changed()
+        if previous is not None and scheduler.running:
+            reschedule_changed_channels(previous)
+
+def start_scheduler():
+    """Schedule this worker's channels with staggered first runs and start the scheduler"""
+    for index, channel_key in enumerate(key for key in CHANNELS_CONFIG if owns_channel(key)):
+        first_run_delay = random.randint(*FIRST_RUN_DELAY_RANGE) + index * CHANNEL_STAGGER
+        schedule_channel(channel_key, first_run_delay)
+    scheduler.start()
 
 async def main():
     """Main function to run the bot"""
-    logger.info("=== AliExpress Multi-Channel Bot Started ===")
-    logger.info("\nActive Channels:")
+    logger.info("AliExpress Multi-Channel Bot started (worker %d of %d)", WORKER_ID, WORKER_COUNT)
     for key, config in CHANNELS_CONFIG.items():
-        if config.get('active', False):
-            logger.info(f"  - {config['name']}: {config['channel_id']} (every {config['posting_interval']} min)")
-            logger.info(f"    Filters: ${config['min_price']}-${config['max_price']}, {len(config['keywords'])} keywords")
-    logger.info(f"\nAdmin IDs: {', '.join(map(str, ADMIN_USER_IDS))}")
-    logger.info("Features: Multi-channel + Smart filtering + URL shortening + Duplicate detection")
+        if config.get('active', False) and owns_channel(key):
+            logger.info("Channel %s: %s every %d min, $%s-$%s, %d keywords", key, config['channel_id'],
+                        config['posting_interval'], config['min_price'], config['max_price'], len(config['keywords']))
+    logger.info("Admin IDs: %s", ', '.join(map(str, ADMIN_USER_IDS)))
     
+    metrics_receiver = None
     try:
-        # Start both tasks concurrently
-        await asyncio.gather(
-            periodic_poster(),
-            handle_admin_commands()
-        )
+        # Channels post from the scheduler, buffers refill in the background,
+        # admin updates are received in the foreground
+        start_scheduler()
+        background_tasks = [asyncio.create_task(PREFETCHER.run()), asyncio.create_task(monitor_event_loop()),
+                            asyncio.create_task(watch_channels_file())]
+        if METRICS_PORT:
+            metrics_receiver = HTTPReceiver(METRICS_LISTEN, METRICS_PORT, {'/metrics': handle_metrics_request})
+            await metrics_receiver.start()
+        await lead_admin_updates()
+        for task in background_tasks:
+            task.cancel()
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Bot error: {e}")
+        logger.error("Bot error: %s", e)
+    finally:
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        if metrics_receiver:
+            await metrics_receiver.close()
+        await ADMIN_DISPATCHER.close()
+        await ADMIN_JOBS.close()
+        await aliexpress_api.close()
+        await LINK_SHORTENER.close()
+        await IMAGE_VALIDATOR.close()
+        await TELEGRAM_SENDER.close()
+        LEADER_LOCK.release()
+        POSTED_PRODUCTS.close()
+        BOT_SETTINGS.close()
+        KEYWORD_STATS.close()
+        PHOTO_CACHE.close()
 
 if __name__ == "__main__":
     asyncio.run(main())